@@ -1,43 +1,152 @@
+from itertools import chain
 import numpy as np
-from numpy.linalg import norm
 import pandas
 
+MOOD_COLUMNS = ("valence", "energy")  # The order of the values in the mood_vec column
+MAX_DISTANCES = 2 ** 22  # Maximal number of distances computed at once
+
+
+def get_mood_matrix(df) -> np.ndarray:
+    """
+    The get_mood_matrix function returns the mood vectors of the tracks as a contiguous (N, 2) float32 matrix of
+    (valence, energy) rows, from the valence and energy columns, or from the mood_vec column if they are missing.
+
+    :param df: The dataframe of the tracks
+    :return: (N, 2) float32 matrix of the tracks' mood vectors
+    """
+    if all(column in df.columns for column in MOOD_COLUMNS):
+        mood_matrix = df[list(MOOD_COLUMNS)].to_numpy(dtype=np.float32)
+    else:
+        mood_matrix = np.array(df["mood_vec"].tolist(), dtype=np.float32).reshape(-1, 2)
+    return np.ascontiguousarray(mood_matrix)
+
+
+class Recommender:
+    """
+    A Recommender finds the tracks whose mood vectors are nearest to the mood vectors of seed tracks.
+    The tracks' mood vectors are kept in a single (N, 2) float32 matrix, so the distances of a batch of seeds to all
+    the tracks are computed at once, and only the n nearest tracks of every seed are sorted.
+    Building a Recommender copies the mood vectors and indexes the ids, so keep it and reuse it while df doesn't change.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.mood_matrix = get_mood_matrix(df=df)
+        self.ids = df["id"].to_numpy() if "id" in df.columns else None
+
+        # The rows of every id, to exclude seeds without comparing their ids to all the tracks' ids
+        self.rows_by_id = ({} if self.ids is None else
+                           pandas.Series(np.arange(len(self.ids))).groupby(self.ids, sort=False).indices)
+
+    def get_excluded_rows(self, exclude_ids) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The get_excluded_rows function finds the rows of the seeds' ids.
+
+        :param exclude_ids: The id of every seed
+        :return: A tuple of aligned arrays - seeds (0) and the rows of their ids (1)
+        """
+        seed_rows = [self.rows_by_id.get(seed_id, ()) for seed_id in exclude_ids]
+        counts = np.fromiter((len(rows) for rows in seed_rows), dtype=np.int64, count=len(seed_rows))
+        seeds = np.repeat(np.arange(len(seed_rows)), counts)
+        rows = np.fromiter(chain.from_iterable(seed_rows), dtype=np.int64, count=int(counts.sum()))
+        return seeds, rows
+
+    def get_distances(self, seed_mood_vecs) -> np.ndarray:
+        """
+        The get_distances function calculates the distances between every seed and every track.
+
+        :param seed_mood_vecs: (Q, 2) array of the seeds' (valence, energy) mood vectors
+        :return: (Q, N) array of the distances
+        """
+        seeds = np.asarray(seed_mood_vecs, dtype=np.float32).reshape(-1, 2)
+        deltas = seeds[:, None, :] - self.mood_matrix[None, :, :]
+        return np.sqrt(np.einsum("qnd,qnd->qn", deltas, deltas))
+
+    def recommend(self, seed_mood_vecs, n_recs: int, exclude_ids=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The recommend function finds the n_recs nearest tracks to every seed.
+
+        :param seed_mood_vecs: (Q, 2) array of the seeds' (valence, energy) mood vectors
+        :param n_recs: Specify the number of recommendations of every seed
+        :param exclude_ids: Optional id of every seed, which is not recommended to itself
+        :return: A tuple of (Q, n_recs) arrays - the rows of the recommended tracks (0) and their distances (1),
+        nearest first. When there are fewer than n_recs tracks, the missing recommendations get row -1
+        """
+        seeds = np.asarray(seed_mood_vecs, dtype=np.float32).reshape(-1, 2)
+        rows = np.full((len(seeds), n_recs), -1, dtype=np.int64)
+        distances = np.full((len(seeds), n_recs), np.inf, dtype=np.float32)
+        if len(self.mood_matrix) == 0 or n_recs <= 0:
+            return rows, distances
+
+        n_found = min(n_recs, len(self.mood_matrix))
+        chunk_size = max(MAX_DISTANCES // len(self.mood_matrix), 1)
+        excluded_seeds, excluded_rows = self.get_excluded_rows(exclude_ids=[] if exclude_ids is None else exclude_ids)
+
+        for start in range(0, len(seeds), chunk_size):
+            chunk_distances = self.get_distances(seed_mood_vecs=seeds[start:start + chunk_size])
+            in_chunk = (excluded_seeds >= start) & (excluded_seeds < start + chunk_size)
+            chunk_distances[excluded_seeds[in_chunk] - start, excluded_rows[in_chunk]] = np.inf
+
+            if n_found < len(self.mood_matrix):
+                nearest = np.argpartition(chunk_distances, n_found - 1, axis=1)[:, :n_found]
+            else:
+                nearest = np.broadcast_to(np.arange(n_found), (len(chunk_distances), n_found))
+            nearest_distances = np.take_along_axis(chunk_distances, nearest, axis=1)
+            nearest_order = np.argsort(nearest_distances, axis=1, kind="stable")
+
+            nearest = np.take_along_axis(nearest, nearest_order, axis=1)
+            nearest_distances = np.take_along_axis(nearest_distances, nearest_order, axis=1)
+            rows[start:start + chunk_size, :n_found] = np.where(np.isinf(nearest_distances), -1, nearest)
+            distances[start:start + chunk_size, :n_found] = nearest_distances
+
+        return rows, distances
+
 
 def calc_dist(track_mood_vec, df):
     """
     The calc_dist function calculates the distance between a given track and all other tracks in the dataset.
 
-    :param track_mood_vec: Calculate the distance between a track and all other tracks in the dataframe
-    :param df: Calculate the distance between a track and all other tracks in the dataset
+    :param track_mood_vec: The (valence, energy) mood vector of the track
+    :param df: The dataframe of all tracks and their mood vectors
     :return: The distance between the track_mood_vec and each of the mood vectors in the dataframe
     """
-    df["distances"] = df["mood_vec"].apply(lambda x: norm(track_mood_vec - np.array(x)))
+    distances = Recommender(df=df).get_distances(seed_mood_vecs=track_mood_vec)[0]
+    df["distances"] = distances
+    return distances
 
 
-def recommend(track_id, df, sp, n_recs):
+def recommend(track_id, df, sp, n_recs, recommender: Recommender = None):
     """
-    The recommend function takes a track id, the dataframe of all tracks and their mood vectors,
-    and Spotify's API object as arguments. It then uses the track_audio_features function from
-    Spotify's API to get information about the suggested track (such as its valence and energy).
-    It then creates a mood vector for that suggested track.
-    The calc_dist function is called on this new mood vector along with all other tracks' in df.
-    Finally, df is sorted by distance in ascending order (i.e., closest first) and only returns n recommendations.&quot;
+    The recommend function takes a track id, or a list of track ids, the dataframe of all tracks and their mood
+    vectors, and Spotify's API object as arguments. It then uses Spotify's audio features to get information about the
+    suggested tracks (such as their valence and energy), and creates their mood vectors.
+    The n_recs nearest tracks of every suggested track are found with a single distance calculation for all of them,
+    and the suggested track itself is not recommended.
 
-    :param track_id: Get the track's information, which is used to create its mood vector
+    :param track_id: Get the track's information, which is used to create its mood vector. A list of ids for a batch
     :param df: Store the mood vectors of all tracks
     :param sp: Make api calls
     :param n_recs: Specify the number of recommendations that will be returned
-    :return: A dataframe of the recommended tracks
+    :param recommender: Optional Recommender of df, reused between calls. A new one is built when not given
+    :return: A dataframe of the recommended tracks, or a list of dataframes for a list of track ids
     """
-    # get suggested track's info and create its mood vec
-    track_info = sp.track_audio_features(track_id)
-    track_mood_vec = np.array(track_info.valence, track_info.energy)
+    track_ids = [track_id] if isinstance(track_id, str) else list(track_id)
 
-    # calculate the distance between the track's mood vec and all other tracks
-    calc_dist(track_mood_vec, df)
+    # get suggested tracks' info and create their mood vecs
+    tracks_info = [sp.track_audio_features(track_id) for track_id in track_ids]
+    track_mood_vecs = np.array([(track_info.valence, track_info.energy) for track_info in tracks_info],
+                               dtype=np.float32)
 
-    # rearrange df by dist, in ascending order, and remove the same track
-    df_sorted = df.sort_values(by="distances", ascending=True)
+    # find the nearest tracks of every suggested track, without the track itself
+    if recommender is None:
+        recommender = Recommender(df=df)
+    rows, distances = recommender.recommend(seed_mood_vecs=track_mood_vecs, n_recs=n_recs, exclude_ids=track_ids)
 
-    return df_sorted.iloc[:n_recs]
+    recommendations = []
+    for track_rows, track_distances in zip(rows, distances):
+        found = track_rows >= 0
+        recs_df = df.iloc[track_rows[found]].copy()
+        recs_df["distances"] = track_distances[found]
+        recommendations.append(recs_df)
 
+    return recommendations[0] if isinstance(track_id, str) else recommendations
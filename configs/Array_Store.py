@@ -0,0 +1,173 @@
+import json
+import mmap
+import numpy as np
+
+###################################################
+# A single-file store of named, aligned arrays.   #
+#                                                 #
+# Layout:                                         #
+#   MAGIC | header length (uint64) | JSON header  #
+#   | padding | array | padding | array | ...     #
+#                                                 #
+# Loading memory-maps the file read-only, so      #
+# forked workers share the same physical pages.   #
+###################################################
+
+MAGIC = b"FEELME\x00\x01"
+ALIGNMENT = 64
+HEADER_LENGTH_DTYPE = np.dtype("<u8")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_arrays(path: str, arrays: dict[str, np.ndarray], meta: dict = None) -> None:
+    """
+    The write_arrays function writes named arrays and a JSON-serializable meta dictionary into a single file.
+    Every array is stored contiguously at an aligned offset, so it can later be memory-mapped in place.
+
+    :param path:str: Path of the file to write
+    :param arrays:dict: Arrays to store, by name. Object arrays are not supported
+    :param meta:dict: Extra information to store in the header
+    :return: None
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError(f"Can't store object array '{name}'")
+
+    # Offsets are relative to the (aligned) end of the header
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps({"meta": meta or {}, "arrays": layout}).encode("utf-8")
+
+    with open(path, "wb") as store_file:
+        store_file.write(MAGIC)
+        store_file.write(np.array(len(header), dtype=HEADER_LENGTH_DTYPE).tobytes())
+        store_file.write(header)
+        data_start = _align(store_file.tell())
+
+        for name, array in arrays.items():
+            store_file.write(b"\x00" * (data_start + layout[name]["offset"] - store_file.tell()))
+            store_file.write(array.tobytes())
+
+
+def read_arrays(path: str) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    The read_arrays function memory-maps a file written by write_arrays.
+    The returned arrays are read-only views of the mapped file, no data is copied.
+
+    :param path:str: Path of the file to read
+    :return: A tuple of the arrays by name (0) and the meta dictionary (1)
+    """
+    with open(path, "rb") as store_file:
+        mapped = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(MAGIC)] != MAGIC:
+        mapped.close()
+        raise ValueError(f"{path} is not an array store file")
+
+    header_length = int(np.frombuffer(mapped, dtype=HEADER_LENGTH_DTYPE, count=1, offset=len(MAGIC))[0])
+    header_start = len(MAGIC) + HEADER_LENGTH_DTYPE.itemsize
+    header = json.loads(mapped[header_start:header_start + header_length])
+    data_start = _align(header_start + header_length)
+
+    arrays = {}
+    for name, layout in header["arrays"].items():
+        dtype = np.dtype(layout["dtype"])
+        shape = tuple(layout["shape"])
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                     offset=data_start + layout["offset"]).reshape(shape)
+
+    return arrays, header["meta"]
+
+
+def pack_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The pack_strings function packs strings into a single utf-8 byte blob and the offsets of each string in it.
+
+    :param strings:list[str]: Strings to pack
+    :return: A tuple of the uint8 blob (0) and the int64 offsets (1), where string i is blob[offsets[i]:offsets[i+1]]
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """
+    The unpack_strings function decodes all strings packed by pack_strings.
+
+    :param blob:np.ndarray: The uint8 blob
+    :param offsets:np.ndarray: The strings' offsets in the blob
+    :return: A list of the strings
+    """
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def unpack_string(blob: np.ndarray, offsets: np.ndarray, i: int) -> str:
+    """
+    The unpack_string function decodes a single packed string without decoding the rest of the blob.
+
+    :param blob:np.ndarray: The uint8 blob
+    :param offsets:np.ndarray: The strings' offsets in the blob
+    :param i:int: Index of the string
+    :return: The i-th string
+    """
+    return blob[int(offsets[i]):int(offsets[i + 1])].tobytes().decode("utf-8")
+
+
+class StringColumn:
+    """
+    A StringColumn is a read-only sequence of strings packed by pack_strings.
+    A string is decoded only when it is accessed, so a column of a memory-mapped file is opened without reading it.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __repr__(self):
+        return f"<StringColumn: {len(self)} strings>"
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"String index {i} out of range")
+        return unpack_string(blob=self.blob, offsets=self.offsets, i=i)
+
+    def __iter__(self):
+        return iter(unpack_strings(blob=self.blob, offsets=self.offsets))
+
+    @classmethod
+    def from_strings(cls, strings: list[str]):
+        blob, offsets = pack_strings(strings=strings)
+        return cls(blob=blob, offsets=offsets)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray], name: str):
+        return cls(blob=arrays[f"{name}_blob"], offsets=arrays[f"{name}_offsets"])
+
+    def to_arrays(self, name: str) -> dict[str, np.ndarray]:
+        """
+        The to_arrays function returns the column's arrays by their names in an array store file (see write_arrays).
+
+        :param name:str: Name of the column
+        :return: A dictionary of the blob and offsets arrays
+        """
+        return {f"{name}_blob": self.blob, f"{name}_offsets": self.offsets}
@@ -0,0 +1,284 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Callable
+
+######################################################
+# Caches of slow API responses.                      #
+#                                                    #
+#   - LRUCache: in-process, least recently used      #
+#     entries are evicted, entries expire after a    #
+#     TTL                                            #
+#   - SQLiteCache: a disk tier of JSON values, kept  #
+#     between runs and shared by processes           #
+#   - TieredCache: an LRUCache in front of a disk    #
+#     tier                                           #
+#                                                    #
+# All caches have get, set and get_or_compute, and   #
+# count their hits and misses in their CacheStats.   #
+# They are safe to use from many threads.            #
+######################################################
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 24 * 60 * 60.0  # Seconds
+MISSING = object()
+
+
+def make_key(*parts) -> str:
+    """
+    The make_key function creates a cache key from JSON-serializable parts, e.g. a prompt and a model config.
+    Dictionaries are keyed regardless of their keys' order.
+
+    :param parts: The parts of the key
+    :return: A hex digest of the parts
+    """
+    return sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    """
+    A CacheStats item counts the hits and misses of a cache, and the entries it dropped.
+    The time spent computing missed values is added by the cache's users (see add_miss_time), and estimates the time
+    the hits saved. The counters are updated under their own lock, so concurrent lookups don't lose counts.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.miss_seconds = 0.0
+
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f"<Hits: {self.hits}, Misses: {self.misses}, Hit rate: {self.hit_rate():.1%}, "
+                f"Evictions: {self.evictions}, Expirations: {self.expirations}, "
+                f"Saved: {self.saved_seconds():.1f} seconds>")
+
+    def add_hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def add_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def add_eviction(self) -> None:
+        with self._lock:
+            self.evictions += 1
+
+    def add_expiration(self) -> None:
+        with self._lock:
+            self.expirations += 1
+
+    def add_miss_time(self, seconds: float) -> None:
+        with self._lock:
+            self.miss_seconds += seconds
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def saved_seconds(self) -> float:
+        # Every hit saved the average time of a miss
+        return self.hits * self.miss_seconds / self.misses if self.misses else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "saved_seconds": self.saved_seconds()
+        }
+
+
+class Cache(ABC):
+    """
+    The base of the caches. Subclasses implement _get (returning MISSING for a missing or expired key), set and clear.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def _get(self, key: str) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._get(key=key)
+        if value is MISSING:
+            self.stats.add_miss()
+            return default
+
+        self.stats.add_hit()
+        return value
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        The get_or_compute function returns the cached value of a key, or computes, caches and returns it.
+        The time of every computation is added to the cache's stats.
+
+        :param key:str: The cache key (see make_key)
+        :param compute:Callable: Computes the value of a missing key
+        :return: The value of the key
+        """
+        value = self.get(key=key, default=MISSING)
+        if value is not MISSING:
+            return value
+
+        start_time = time.perf_counter()
+        value = compute()
+        self.stats.add_miss_time(seconds=time.perf_counter() - start_time)
+
+        self.set(key=key, value=value)
+        return value
+
+
+class LRUCache(Cache):
+    """
+    An in-process cache of at most max_size entries. Entries expire ttl seconds after they were set, and the least
+    recently used entry is evicted when the cache is full.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.max_size = max(int(max_size), 1)
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()  # key -> (expiration time, value), least recently used first
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<LRUCache | Entries: {len(self)}/{self.max_size}, TTL: {self.ttl} | {self.stats}>"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+
+            expiration_time, value = entry
+            if expiration_time <= self.clock():
+                del self._entries[key]
+                self.stats.add_expiration()
+                return MISSING
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.add_eviction()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(Cache):
+    """
+    A disk cache of JSON-serializable values in a SQLite file. Entries expire ttl seconds after they were set, and
+    expired entries are deleted when they are read.
+    """
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cache "
+                                     "(key TEXT PRIMARY KEY, expiration_time REAL, value TEXT)")
+
+    def __repr__(self):
+        return f"<SQLiteCache | Path: {self.path}, TTL: {self.ttl} | {self.stats}>"
+
+    def _get(self, key: str) -> Any:
+        with self._lock:
+            row = self._connection.execute("SELECT expiration_time, value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return MISSING
+
+            expiration_time, value = row
+            if expiration_time <= time.time():
+                with self._connection:
+                    self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.stats.add_expiration()
+                return MISSING
+
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        serialized_value = json.dumps(value)
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                                     (key, time.time() + self.ttl, serialized_value))
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class TieredCache(Cache):
+    """
+    A TieredCache looks keys up in an in-process LRUCache, then in a disk tier. Values found on disk are copied to
+    the memory tier. Every tier keeps its own stats, and the TieredCache's stats count the lookups of both.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Cache = None):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def __repr__(self):
+        return f"<TieredCache | Memory: {self.memory}, Disk: {self.disk} | {self.stats}>"
+
+    def _get(self, key: str) -> Any:
+        value = self.memory.get(key=key, default=MISSING)
+        if value is not MISSING or self.disk is None:
+            return value
+
+        value = self.disk.get(key=key, default=MISSING)
+        if value is not MISSING:
+            self.memory.set(key=key, value=value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key=key, value=value)
+        if self.disk is not None:
+            self.disk.set(key=key, value=value)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
@@ -1,4 +1,5 @@
 class MoodVec:
+    __slots__ = ("energy", "valence")
 
     def __init__(self,
                  energy: float = 0.0,
@@ -3,6 +3,7 @@ from items.MoodVec import MoodVec
 
 
 class Song:
+    __slots__ = ("title", "artist", "mood_vec", "spotify_ID", "href")
 
     # Class Attributes
     title: str
@@ -31,8 +32,8 @@ class Song:
         cls = self.__class__
         result = cls.__new__(cls)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, deepcopy(v, memo))
+        for k in self.__slots__:
+            setattr(result, k, deepcopy(getattr(self, k), memo))
         return result
 
     def get_title(self):
@@ -1,7 +1,8 @@
 import os, re, csv, json, sys, string
 import numpy as np
 import pandas as pd
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
+from multiprocessing import Pool
 
 import gzip
 
@@ -18,13 +19,18 @@ parser.add_argument('--dataPath', help='path to CSV data file with texts')
 parser.add_argument('--lexPath', help='path to lexicon. CSV with columns "word" plus emotion columns')
 parser.add_argument('--lexNames', nargs="*", type=str, help='Names of the lexicons/column names in the lexicon CSV')
 parser.add_argument('--savePath', help='path to save folder')
+parser.add_argument('--chunkSize', type=int, default=100000, help='number of CSV rows to read and score at a time')
+parser.add_argument('--workers', type=int, default=1, help='number of processes scoring chunks in parallel')
+
+# Lexicons of the scoring process, set once per worker process (see init_worker)
+WORKER_LEXDICTS = None
 
 
 def read_lexicon(path, LEXNAMES):  # Basic "cleanup" for lexicon
     df = pd.read_csv(path)  # Load .csv file
     df = df[~df['word'].isna()]  # Load only non-NaN (using ~ and .isna()) words
     df = df[['word']+LEXNAMES]
-    df['word'] = df['word'].rename(str.lower)
+    df['word'] = df['word'].str.lower()
     # df['word'] = [x.lower() for x in df['word']]
     return df
     # df = df[~df['val'].isna()]
@@ -33,46 +39,77 @@ def read_lexicon(path, LEXNAMES):  # Basic "cleanup" for lexicon
 def prep_dim_lexicon(df, dim):
     ldf = df[['word']+[dim]]
     ldf = ldf[~ldf[dim].isna()]
-    ldf.drop_duplicates(subset=['word'], keep='first', inplace=True)
-    ldf[dim] = [float(x) for x in ldf[dim]]
-    ldf.rename({dim: 'val'}, axis='columns', inplace=True)
-    ldf.set_index('word', inplace=True)
-    return ldf
+    ldf = ldf.drop_duplicates(subset=['word'], keep='first')
+    return dict(zip(ldf['word'], [float(x) for x in ldf[dim]]))  # word -> val
 
 
 def get_alpha(token):
     return token.isalpha()
 
 
-def get_vals(twt, lexdf):
-    tt = twt.lower().split(" ")
-    at = [w for w in tt if w.isalpha()]
+def get_vals(twt, lexdicts):
+    if not isinstance(twt, str):
+        twt = ""
 
-    pw = [x for x in tt if x in lexdf.index]
-    pv = [lexdf.loc[w]['val'] for w in pw]
+    tt = twt.lower().split(" ")
+    numTokens = sum(1 for w in tt if w.isalpha())
 
-    numTokens = len(at)
-    numLexTokens = len(pw)
-    
-    avgLexVal = np.mean(pv)  #nan for 0 tokens
+    vals = []
+    for lexdict in lexdicts:
+        pv = [lexdict[x] for x in tt if x in lexdict]
+        numLexTokens = len(pv)
+        avgLexVal = sum(pv) / numLexTokens if numLexTokens else np.nan  #nan for 0 tokens
+        vals.append([numTokens, numLexTokens, avgLexVal])
 
-    return [numTokens, numLexTokens, avgLexVal]
+    return vals
 
 
-def process_df(df, lexdf):
+def process_df(df, lexdicts):
+    # Scores every lexicon dimension in a single pass over the texts
     logging.info("Number of rows: " + str(len(df)))
 
-    resrows = [get_vals(x, lexdf) for x in df['text']]
-    resrows = [x + y for x,y in zip(df.values.tolist(), resrows)]
+    vals = [get_vals(x, lexdicts) for x in df['text']]
+    rows = df.values.tolist()
+
+    resdfs = []
+    for i in range(len(lexdicts)):
+        resrows = [x + y[i] for x, y in zip(rows, vals)]
+
+        resdf = pd.DataFrame(resrows, columns=df.columns.tolist() + ['numTokens', 'numLexTokens', 'avgLexVal'])
+        resdf = resdf[resdf['numLexTokens']>=1]
+
+        resdf['lexRatio'] = resdf['numLexTokens']/resdf['numTokens']
+        resdfs.append(resdf)
+    return resdfs
+
 
-    resdf = pd.DataFrame(resrows, columns=df.columns.tolist() + ['numTokens', 'numLexTokens', 'avgLexVal'])
-    resdf = resdf[resdf['numLexTokens']>=1]
-    
-    resdf['lexRatio'] = resdf['numLexTokens']/resdf['numTokens']
-    return resdf
+def init_worker(lexdicts):
+    global WORKER_LEXDICTS
+    WORKER_LEXDICTS = lexdicts
 
 
-def main(dataPath, LEXICON, LEXNAMES, savePath):
+def process_chunk(df):
+    return process_df(df, WORKER_LEXDICTS)
+
+
+def score_chunks(chunks, lexdicts, workers):
+    # Yields the scored chunks in order. At most 2 chunks per worker are in flight, which bounds the memory
+    if workers <= 1:
+        for df in chunks:
+            yield process_df(df, lexdicts)
+        return
+
+    with Pool(processes=workers, initializer=init_worker, initargs=(lexdicts,)) as pool:
+        pending = deque()
+        for df in chunks:
+            pending.append(pool.apply_async(process_chunk, (df,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def main(dataPath, LEXICON, LEXNAMES, savePath, chunkSize=100000, workers=1):
 
     os.makedirs(savePath, exist_ok=True)
 
@@ -81,16 +118,20 @@ def main(dataPath, LEXICON, LEXNAMES, savePath):
     logging.basicConfig(filename=logfile, format='%(asctime)s - %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S',
                     level=logging.INFO)
-    
-    df = pd.read_csv(dataPath)
 
+    lexdicts = []
     for LEXNAME in LEXNAMES:
+        lexdict = prep_dim_lexicon(LEXICON, LEXNAME)
+        logging.info(LEXNAME + " lexicon length: " + str(len(lexdict)))
+        lexdicts.append(lexdict)
+
+    savePaths = [os.path.join(savePath, LEXNAME+'.csv') for LEXNAME in LEXNAMES]
 
-        lexdf = prep_dim_lexicon(LEXICON, LEXNAME)
-        logging.info(LEXNAME + " lexicon length: " + str(len(lexdf)))
-        resdf = process_df(df, lexdf)
-    
-        resdf.to_csv(os.path.join(savePath, LEXNAME+'.csv'), index=False)
+    # Results are appended chunk by chunk, the header is written with the first chunk
+    chunks = pd.read_csv(dataPath, chunksize=chunkSize)
+    for i, resdfs in enumerate(tqdm(score_chunks(chunks, lexdicts, workers), unit='chunk')):
+        for resdf, path in zip(resdfs, savePaths):
+            resdf.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
 
 
 if __name__=='__main__':
@@ -104,4 +145,4 @@ if __name__=='__main__':
 
     savePath = args.savePath
 
-    main(dataPath, LEXICON, LEXNAMES, savePath)
\ No newline at end of file
+    main(dataPath, LEXICON, LEXNAMES, savePath, args.chunkSize, args.workers)
@@ -1,5 +1,6 @@
+from dataclasses import dataclass
 from openai.openai_object import OpenAIObject
-from sources.openai.OpenAI_API_Manager import get_OpenAI_analysis
+from sources.openai.OpenAI_API_Manager import get_OpenAI_analysis, get_OpenAI_analyses
 from configs import Utils
 
 
@@ -52,29 +53,72 @@ def extract_response_info(response_text: str) -> dict:
     return {**sentiments, **keywords}
 
 
+@dataclass(frozen=True, slots=True)
 class QueryData:
-    data = {
-        "text": "",
-        "sentiments": [],
-        "keywords": []
-    }
+    """
+    A QueryData item is the immutable, parsed form of a user's query:
+        - text: The original text of the query
+        - sentiments: The sentiments the OpenAI model found in the text
+        - keywords: The keywords the OpenAI model found in the text
+    Parsing is separate from the API call: from_response parses any response, e.g. a cached one, and fetch calls the
+    API and parses its response.
+    """
+    text: str
+    sentiments: tuple[str, ...] = ()
+    keywords: tuple[str, ...] = ()
+
+    @classmethod
+    def from_response(cls, query: str, response: OpenAIObject | dict):
+        """
+        The from_response function parses a response from the OpenAI API. The function first fetches the relevant text
+        from the response, and then extracts the sentiments and keywords of the text with the extract methods.
 
-    def set_response_data(self, response: OpenAIObject):
+        :param query:str: The user's query that the response analyzed
+        :param response: Pass in the response from the api, or its JSON dictionary
+        :return: QueryData object
         """
-        The parse_OpenAI_response function takes in a response from the OpenAI API and parses it into a dictionary.
-        The function first fetches the relevant text from the response, and then splits the text of the response by
-        the constant seperator. The function then extracts these values using extract methods and returns them as a dictionary.
+        response_data = extract_response_info(response_text=response["choices"][0]["text"])
+        return cls(text=query,
+                   sentiments=tuple(response_data["sentiments"]),
+                   keywords=tuple(response_data["keywords"]))
 
-        :param response: Pass in the response from the api
-        :return: A dictionary with the following keys:
+    @classmethod
+    def fetch(cls, query: str):
         """
+        The fetch function analyzes a query with the OpenAI API (see get_OpenAI_analysis) and parses the response.
 
-        response_data = extract_response_info(response_text=
-                                              response["choices"][0]["text"])
+        :param query:str: The user's query
+        :return: QueryData object
+        """
+        return cls.from_response(query=query, response=get_OpenAI_analysis(query=query))
 
-        self.data.update(response_data)
+    @classmethod
+    def fetch_many(cls, queries: list[str], **batch_options) -> list:
+        """
+        The fetch_many function analyzes many queries with the batch mode of the OpenAI API (see get_OpenAI_analyses)
+        and parses their responses. A response that can't be parsed doesn't fail the others.
 
-    def __init__(self, query: str):
-        openai_response = get_OpenAI_analysis(query=query)
-        self.set_response_data(response=openai_response)
-        self.data.update({"text": query})
+        :param queries:list: The users' queries
+        :param batch_options: Options of get_OpenAI_analyses, e.g. batch_size
+        :return: A QueryData object per query, or None for a query whose response couldn't be parsed
+        """
+        query_datas = []
+        for query, response in zip(queries, get_OpenAI_analyses(queries=queries, **batch_options)):
+            try:
+                query_datas.append(cls.from_response(query=query, response=response))
+            except (IndexError, KeyError):
+                query_datas.append(None)
+
+        failed = sum(query_data is None for query_data in query_datas)
+        if failed:
+            print(f"Failed parsing {failed} responses")
+        return query_datas
+
+    @property
+    def data(self) -> dict:
+        # A new dictionary in the former data format, with text, sentiments and keywords keys
+        return {
+            "text": self.text,
+            "sentiments": list(self.sentiments),
+            "keywords": list(self.keywords)
+        }
@@ -1,10 +1,29 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from items.Gif import Gif
 from items.MoodItem import MoodItem
-from sources.giphy.Giphy_API_Manager import get_gif_data_from_giphy
+from sources.giphy.Gif_Pool import GIF_POOL
 from search_engine.QueryData import QueryData
 from search_engine.analyzers.MoodVec_Analyzer import calc_query_mood_vec
 from items.Song import Song
 
+#############
+# CONSTANTS #
+#############
+
+# Seconds every stage of a search may take. The gif and song stages run concurrently, so both are counted from the
+# moment the query is parsed
+STAGE_TIMEOUTS = {
+    "query": 15.0,
+    "gif": 5.0,
+    "song": 10.0
+}
+SEARCH_WORKERS = 8
+
+# Shared by all searches, so that a search doesn't wait for the threads of its timed out stages
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+
+#############
 
 ##########################
 # SONG SEARCHING METHODS #
@@ -31,21 +50,24 @@ def search_song(text: str, sentiments: str):
 #########################
 
 
-def search_gif(keywords: list[str]) -> Gif:
+def search_gif(keywords: list[str]) -> Gif | None:
     """
     The create_gif function takes a list of keywords and returns a Gif object.
-    The function first creates the query string using the create_keywords_query function, then uses that query to search for gifs on giphy.com.
-    It then takes the data from that search and creates a new Gif object with it's giphy id, keywords, and images.
+    The function takes a gif of the keywords from GIF_POOL, which serves prefetched gifs of giphy.com from memory and
+    rotates through them, so repeated keywords don't always get the same gif.
+    It then takes the data of that gif and creates a new Gif object with it's giphy id, keywords, and images.
 
     :param keywords:list: Pass in a list of keywords to be used
-    :return: A gif object
+    :return: A gif object, or None if giphy.com has no gifs of the keywords
     """
 
-    gif_data = get_gif_data_from_giphy(keywords_list=keywords)
+    gif_data = GIF_POOL.get(keywords_list=keywords)
+    if gif_data is None:
+        return None
 
-    new_gif = Gif(giphy_id=gif_data[0].get("id"),
+    new_gif = Gif(giphy_id=gif_data.get("id"),
                   keywords=" ,".join(keywords),
-                  images=gif_data[0].get("images"))
+                  images=gif_data.get("images"))
 
     return new_gif
 
@@ -55,22 +77,61 @@ def search_gif(keywords: list[str]) -> Gif:
 ######################
 
 
-def search(query: str) -> MoodItem:
+def wait_for_stage(future: Future, stage: str, deadline: float):
+    """
+    The wait_for_stage function waits for the result of a search stage that runs in SEARCH_EXECUTOR.
+    A stage that is still running at its deadline keeps running in its thread, but its result is not waited for.
+
+    :param future:Future: The future of the stage
+    :param stage:str: The name of the stage, for the error message
+    :param deadline:float: The time.monotonic() time at which the stage times out
+    :return: The result of the stage
+    """
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0.0))
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"The {stage} stage of the search timed out")
+
+
+def search(query: str, timeouts: dict = None) -> MoodItem:
     """
     The search function takes a query string and returns a MoodItem object with ready to populate
     song and gif information.
+    The query is parsed first, then the gif and song stages, which only depend on the parsed query, run concurrently.
+    The search takes about as long as the parsing and the slower of the two stages.
 
     :param query:str: Pass in the query string from the user
-    :return: MoodItem object
+    :param timeouts:dict: Optional timeouts of some of the stages, in seconds (see STAGE_TIMEOUTS)
+    :return: MoodItem object. When the gif stage times out or fails, the MoodItem has no gif
 
     """
-    query_data = QueryData(query=query)
+    timeouts = {**STAGE_TIMEOUTS, **(timeouts or {})}
+
+    query_future = SEARCH_EXECUTOR.submit(QueryData.fetch, query=query)
+    query_data = wait_for_stage(future=query_future, stage="query", deadline=time.monotonic() + timeouts["query"])
+
+    stages_start = time.monotonic()
+    gif_future = SEARCH_EXECUTOR.submit(search_gif, keywords=list(query_data.keywords))
+    song_future = SEARCH_EXECUTOR.submit(search_song, text=query_data.text,
+                                         sentiments=query_data.sentiments)
+
+    try:
+        song = wait_for_stage(future=song_future, stage="song", deadline=stages_start + timeouts["song"])
+    except TimeoutError:
+        gif_future.cancel()
+        raise
+
+    try:
+        gif = wait_for_stage(future=gif_future, stage="gif", deadline=stages_start + timeouts["gif"])
+    except Exception as error:  # The gif is optional: a timeout or a Giphy error doesn't fail the search
+        print(f"The gif stage failed ({error!r}), the result has no gif")
+        gif = None
 
-    gif = search_gif(keywords=query_data.data["keywords"])
-    song = search_song(text=query_data.data["text"], sentiments=query_data.data["sentiments"])
     example_song = Song(artist="artist", title="title", mood_vec=song)
     return MoodItem(song=example_song, gif=gif)
 
 
-result = search(query="I got up really early. I wanted to go surf. It was difficult getting myself out of bed, and out of the house. I haven't had much sleep the last past nights but as soon as I saw the sea I was filled with joy and energy that helped me through my day")
-print(result.song.mood_vec)
\ No newline at end of file
+if __name__ == '__main__':
+    result = search(query="I got up really early. I wanted to go surf. It was difficult getting myself out of bed, and out of the house. I haven't had much sleep the last past nights but as soon as I saw the sea I was filled with joy and energy that helped me through my day")
+    print(result.song.mood_vec)
\ No newline at end of file
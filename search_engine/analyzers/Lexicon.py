@@ -0,0 +1,228 @@
+import os
+import numpy as np
+import pandas as pd
+from items.MoodVec import MoodVec
+from configs.Array_Store import write_arrays, read_arrays, pack_strings, unpack_strings
+
+#############
+# CONSTANTS #
+#############
+
+LEXICONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "lexicons"))
+BINARY_LEXICON_NAME = "NRC-VAD-Lexicon.bin"
+DIMENSIONS = ("valence", "arousal", "dominance")
+
+# Main lexicon table of each language: file, separator, word column and the (valence, arousal, dominance) columns
+LEXICON_TABLES = {
+    "en": ("en/NRC-VAD-Lexicon_csv.csv", ",", "word", ("valence", "arousal", "dominance")),
+    "he": ("he/Hebrew-NRC-VAD-Lexicon.txt", "\t", "Hebrew Word", ("Valence", "Arousal", "Dominance"))
+}
+
+# Per-dimension "word<TAB>value" files of each language
+LEXICON_DIMENSION_FILES = {
+    "en": {
+        "arousal": "en/arousal-NRC-VAD-Lexicon.txt",
+        "dominance": "en/dominance-NRC-VAD-Lexicon.txt"
+    }
+}
+
+#############
+
+
+class Lexicon:
+    """
+    A Lexicon item holds the valence, arousal and dominance values of every word in an NRC-VAD lexicon.
+    The words are indexed once when the lexicon is loaded, so a single token lookup is a dict access
+    and many tokens can be looked up at once as aligned NumPy arrays.
+    """
+
+    def __init__(self, words: list[str],
+                 valence: np.ndarray,
+                 arousal: np.ndarray,
+                 dominance: np.ndarray):
+
+        self.words = list(words)
+        self.valence = np.asarray(valence)
+        self.arousal = np.asarray(arousal)
+        self.dominance = np.asarray(dominance)
+
+        # Reversed so the first occurrence of a duplicated word wins
+        self.index = dict(zip(reversed(self.words), range(len(self.words) - 1, -1, -1)))
+
+    def __repr__(self):
+        return f"<Lexicon: {len(self)} words>"
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.index
+
+    @classmethod
+    def from_sources(cls, lang: str):
+        """
+        The from_sources function builds the lexicon of a language from its source text files.
+
+        :param lang:str: Encoded language code string
+        :return: Lexicon object
+        """
+        lex_df = read_lexicon_sources(lang=lang)
+        return cls(words=lex_df["word"].tolist(),
+                   valence=lex_df["valence"].to_numpy(dtype=np.float32),
+                   arousal=lex_df["arousal"].to_numpy(dtype=np.float32),
+                   dominance=lex_df["dominance"].to_numpy(dtype=np.float32))
+
+    @classmethod
+    def from_binary(cls, path: str):
+        """
+        The from_binary function memory-maps a lexicon compiled by compile_lexicon.
+        The value columns stay in the mapped file, so processes that load the same file share its pages.
+
+        :param path:str: Path to the compiled lexicon file
+        :return: Lexicon object
+        """
+        arrays, _ = read_arrays(path=path)
+        vad = arrays["vad"]
+        return cls(words=unpack_strings(blob=arrays["words_blob"], offsets=arrays["words_offsets"]),
+                   valence=vad[:, 0],
+                   arousal=vad[:, 1],
+                   dominance=vad[:, 2])
+
+    @classmethod
+    def load(cls, lang: str):
+        """
+        The load function loads the lexicon of a language, from its compiled file if there is one,
+        and from the source files otherwise.
+
+        :param lang:str: Encoded language code string
+        :return: Lexicon object
+        """
+        binary_path = get_binary_path(lang=lang)
+        if os.path.exists(binary_path):
+            return cls.from_binary(path=binary_path)
+        return cls.from_sources(lang=lang)
+
+    def lookup(self, token: str) -> MoodVec | None:
+        """
+        The lookup function returns the MoodVec of a single token.
+
+        :param token:str: Tokenized word from text
+        :return: MoodVec for token; None if token is not in the lexicon
+        """
+        word_id = self.index.get(token)
+
+        if word_id is None:
+            return None
+
+        return MoodVec(energy=float(self.arousal[word_id]), valence=float(self.valence[word_id]))
+
+    def lookup_ids(self, tokens: list[str]) -> np.ndarray:
+        """
+        The lookup_ids function maps every token to its row in the lexicon.
+
+        :param tokens:list[str]: Tokenized words from text
+        :return: An int64 array aligned with tokens, holding -1 for tokens that are not in the lexicon
+        """
+        index = self.index
+        return np.fromiter((index.get(token, -1) for token in tokens), dtype=np.int64, count=len(tokens))
+
+    def lookup_many(self, tokens: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The lookup_many function looks up a list of tokens at once.
+
+        :param tokens:list[str]: Tokenized words from text
+        :return: A tuple of float64 arrays aligned with tokens - energy (0), valence (1) and whether the token is in
+        the lexicon (2). Tokens that are not in the lexicon get 0.0 energy and valence.
+        """
+        word_ids = self.lookup_ids(tokens=tokens)
+        in_lexicon = word_ids >= 0
+
+        energy = np.where(in_lexicon, self.arousal[word_ids], 0.0).astype(np.float64, copy=False)
+        valence = np.where(in_lexicon, self.valence[word_ids], 0.0).astype(np.float64, copy=False)
+
+        return energy, valence, in_lexicon
+
+
+############################
+# LEXICON COMPILATION STEP #
+############################
+
+
+def get_binary_path(lang: str) -> str:
+    """
+    The get_binary_path function returns the path of the compiled lexicon file of a language.
+
+    :param lang:str: Encoded language code string
+    :return: Path to the compiled lexicon file
+    """
+    return os.path.join(LEXICONS_DIR, lang, BINARY_LEXICON_NAME)
+
+
+def read_lexicon_sources(lang: str) -> pd.DataFrame:
+    """
+    The read_lexicon_sources function reads the main lexicon table of a language and merges its per-dimension files in.
+    Values from a dimension file override the table's values. Words that appear only in a dimension file are added
+    when they are a table word written without spaces (e.g. "allsmiles" for "all smiles"), and are skipped otherwise,
+    as their other dimensions are unknown.
+
+    :param lang:str: Encoded language code string
+    :return: A DataFrame with the columns word, valence, arousal and dominance, sorted by word with unique words
+    """
+    table_path, sep, word_column, value_columns = LEXICON_TABLES[lang]
+
+    # keep_default_na=False keeps words such as "null" and "nan" as words
+    table_df = pd.read_csv(os.path.join(LEXICONS_DIR, table_path), sep=sep, keep_default_na=False)
+    lex_df = pd.DataFrame({"word": table_df[word_column].astype(str).str.strip()})
+    for dimension, column in zip(DIMENSIONS, value_columns):
+        lex_df[dimension] = table_df[column].astype(np.float64)
+
+    lex_df = lex_df[lex_df["word"] != ""].drop_duplicates(subset="word", keep="first")
+    lex_df = lex_df.set_index("word")
+
+    despaced = {word.replace(" ", ""): word for word in lex_df.index if " " in word}
+
+    for dimension, dimension_path in LEXICON_DIMENSION_FILES.get(lang, {}).items():
+        dimension_df = pd.read_csv(os.path.join(LEXICONS_DIR, dimension_path), sep="\t", header=None,
+                                   names=["word", "value"], keep_default_na=False, dtype={"word": str})
+
+        dimension_df = dimension_df.drop_duplicates(subset="word", keep="first")
+        dimension_df["value"] = dimension_df["value"].astype(np.float64)
+
+        in_table = dimension_df["word"].isin(lex_df.index)
+        lex_df.loc[dimension_df.loc[in_table, "word"], dimension] = dimension_df.loc[in_table, "value"].to_numpy()
+
+        aliases_df = dimension_df[~in_table & dimension_df["word"].isin(despaced.keys())]
+        if not aliases_df.empty:
+            alias_rows = lex_df.loc[aliases_df["word"].map(despaced)]
+            alias_rows.index = pd.Index(aliases_df["word"], name="word")
+            alias_rows[dimension] = aliases_df["value"].to_numpy()
+            lex_df = pd.concat([lex_df, alias_rows])
+
+    return lex_df.sort_index().reset_index()
+
+
+def compile_lexicon(lang: str, path: str = None) -> str:
+    """
+    The compile_lexicon function compiles the source files of a language into a single binary lexicon file:
+    a sorted utf-8 string table of the words, and float32 valence, arousal and dominance columns.
+
+    :param lang:str: Encoded language code string
+    :param path:str: Path of the compiled file. Defaults to the language's lexicon folder
+    :return: Path of the compiled file
+    """
+    path = get_binary_path(lang=lang) if path is None else path
+    lex_df = read_lexicon_sources(lang=lang)
+
+    words_blob, words_offsets = pack_strings(strings=lex_df["word"].tolist())
+    vad = lex_df[list(DIMENSIONS)].to_numpy(dtype=np.float32)
+
+    write_arrays(path=path,
+                 arrays={"words_blob": words_blob, "words_offsets": words_offsets, "vad": vad},
+                 meta={"lang": lang, "words": len(lex_df), "dimensions": list(DIMENSIONS)})
+    return path
+
+
+if __name__ == '__main__':
+    for language in LEXICON_TABLES.keys():
+        compiled_path = compile_lexicon(lang=language)
+        print(f"Compiled '{language}' lexicon: {compiled_path}")
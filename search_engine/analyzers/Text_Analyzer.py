@@ -1,111 +1,78 @@
-from items.MoodVec import MoodVec
+from dataclasses import dataclass
+from itertools import chain
+from threading import Lock
+from typing import Iterable
+import numpy as np
 import pandas as pd
+from items.MoodVec import MoodVec
 from configs.Utils import clean_word
+from search_engine.analyzers.Lexicon import Lexicon
 
 #############
 # CONSTANTS #
 #############
 
-LEX_CSV_PATH = "/Users/tomermildworth/Desktop/Coding/FeelMe/feelme/lexicons/en/NRC-VAD-Lexicon_csv.csv"
 DEFAULT_LANGUAGE = "en"
-
-###########
-# GLOBALS #
-###########
-
-global LEXICON
-global QUERY_INFO_DICT
+BATCH_COLUMNS = ["text", "lang", "total_tokens", "tokens_in_lexicon", "energy", "valence", "rating"]
 
 #############
 
 
-def create_info_dict(text: str):
+@dataclass(frozen=True)
+class TextAnalysis:
     """
-    The create_info_dict function takes a string as input and sets the global dictionary with the following:
+    A TextAnalysis item is the immutable result of analyzing a single text:
         - text: The original text that was passed in to be analyzed.
-        - tokens: A dictionary containing the total number of tokens, the number of tokens in the lexicon,
-            and average valence/energy scores for the text.
         - lang: The language of the given text
+        - total_tokens: The total number of tokens in the text
+        - tokens_in_lexicon: The number of tokens that appear in the lexicon
         - energy: Energy score for the text
         - valence: Valence score for the text
         - rating: The ratings of this analysis, calculated by ratio between total tokens and tokens in lexicon
-
-    :param text:str: The text that is to be analyzed
-
     """
-    global QUERY_INFO_DICT
-    lang = detect_lang()
-    QUERY_INFO_DICT = {
-        "text": text,
-        "tokens": {
-            "total_tokens": 0,
-            "tokens_in_lexicon": 0,
-        },
-        "lang": lang,
-        "energy": 0.0,
-        "valence": 0.0,
-        "rating": 0.0
-    }
-    set_total_tokens()
-
-
-def detect_lang():  # TODO: ADD RETURN TYPE. Build language detection engine
+    text: str | tuple[str, ...]
+    lang: str
+    total_tokens: int
+    tokens_in_lexicon: int
+    energy: float
+    valence: float
+    rating: float
+
+    def get_mood_vec(self) -> MoodVec:
+        return MoodVec(energy=self.energy, valence=self.valence)
+
+    def to_dict(self) -> dict:
+        """
+        The to_dict function returns a new dictionary in the analysis dictionary format:
+            - text, lang, energy, valence and rating as above
+            - tokens: A dictionary containing the total number of tokens and the number of tokens in the lexicon
+
+        :return: A dictionary of the text's mood analysis
+        """
+        return {
+            "text": self.text,
+            "tokens": {
+                "total_tokens": self.total_tokens,
+                "tokens_in_lexicon": self.tokens_in_lexicon,
+            },
+            "lang": self.lang,
+            "energy": self.energy,
+            "valence": self.valence,
+            "rating": self.rating
+        }
+
+
+def detect_lang(text: str | list[str]) -> str:  # TODO: Build language detection engine
     """
     The detect_lang function takes the given text and returns its language encoding
 
+    :param text:str: The text that is to be analyzed
     :return: Encoded language code
     """
-    # TODO: lang_code = detect_language(text=QUERY_INFO_DICT["text"]), return lang_code.
+    # TODO: lang_code = detect_language(text=text), return lang_code.
     return DEFAULT_LANGUAGE
 
 
-def set_total_tokens():
-    """
-    The set_total_tokens function sets the total number of tokens in the text.
-
-    :return: None
-    """
-    QUERY_INFO_DICT["tokens"]["total_tokens"] = len(tokenize(QUERY_INFO_DICT["text"]))
-
-
-#############
-
-
-def set_mood_info():
-    """
-    The set_mood_info function sets the value of energy, valence and rating in the main dictionary
-
-    :return None
-    """
-    calc_energy_valence()
-    calc_rating()
-
-
-def calc_energy_valence():
-    """
-    The calc_energy_valence function calculates and sets the energy and valence values in the main dictionary.
-    Values are calculated by the average energy and valence across all tokens that appear in the lexicon.
-
-    :return: None
-    """
-    totals_moodvec = calc_tokens_totals_vec(text=QUERY_INFO_DICT["text"])
-    total_lex_tokens = QUERY_INFO_DICT["tokens"]["tokens_in_lexicon"]
-    QUERY_INFO_DICT["energy"] = totals_moodvec.energy / total_lex_tokens
-    QUERY_INFO_DICT["valence"] = totals_moodvec.valence / total_lex_tokens
-
-
-def calc_rating():
-    """
-    The calc_rating function calculates the rating of a query by dividing the number of tokens in
-    the lexicon by the total number of tokens. The result is stored in QUERY_INFO_DICT[&quot;rating&quot;].
-
-
-    :return: The ratio of the number of tokens in the lexicon to the total number of tokens
-    """
-    rating = QUERY_INFO_DICT["tokens"]["tokens_in_lexicon"] / QUERY_INFO_DICT["tokens"]["total_tokens"]
-    QUERY_INFO_DICT["rating"] = rating
-
-
 def tokenize(text: str | list[str]) -> list[str]:
     """
     The tokenize function takes a string as input and returns a list of tokens.
@@ -117,114 +84,197 @@ def tokenize(text: str | list[str]) -> list[str]:
 
     """
     split_txt = text.split() if type(text) == str else text
-    split_txt[:] = [clean_word(word=word) for word in split_txt]
-    return split_txt
-
+    return [clean_word(word=word) for word in split_txt]
 
-def cnt_token_in_lex():
-    """
-    The cnt_token_in_lex function increments the tokens_in_lexicon count by 1.
-
-    :return: None
 
+def calc_tokens_totals_vec(tokens: list[str], lexicon: Lexicon) -> tuple[MoodVec, int]:
     """
-    QUERY_INFO_DICT["tokens"]["tokens_in_lexicon"] += 1
-
-
-def calc_tokens_totals_vec(text: str | list[str]) -> MoodVec:
-    """
-    The calc_tokens_totals_vec function takes a string of text as input and returns a Mood_Vec object with the total
-    energy and valence values for that text.
-    The function first tokenizes the given text into individual words, then it checks if each word is in our lexicon.
-    If so, it adds a count and calculates its mood values, Otherwise it generates an empty Mood_Vec object
+    The calc_tokens_totals_vec function takes a list of tokens and returns a Mood_Vec object with the total
+    energy and valence values for them, along with the number of tokens that are in the lexicon.
+    All tokens are looked up in the lexicon at once. Tokens that are not in the lexicon get empty mood values
     (energy and valence set to 0.0). Finally the mood values are summed and returned as a Mood_Vec.
 
-    :param text:str: The text to be analyzed
-    :return: A Mood_Vec object that contains the total energy and valence values of all tokens in the text
+    :param tokens:list[str]: Tokenized words from the text to be analyzed
+    :param lexicon:Lexicon: The lexicon of the text's language
+    :return: A tuple of a Mood_Vec object with the total energy and valence values of all tokens (0) and
+    the number of tokens in the lexicon (1)
     """
+    energy, valence, in_lexicon = lexicon.lookup_many(tokens=tokens)
+    return MoodVec(energy=float(energy.sum()), valence=float(valence.sum())), int(in_lexicon.sum())
 
-    tokens_list = tokenize(text=text) if type(text) == str else text
-    prev_tokens = {}
-
-    total_energy = 0.0
-    total_valence = 0.0
-
-    for token in tokens_list:
-
-        if token in prev_tokens:
-            if prev_tokens[token]["in_lex"]:
-                cnt_token_in_lex()
-            total_energy += prev_tokens[token]["mood_vec"].energy
-            total_valence += prev_tokens[token]["mood_vec"].valence
-
-        else:
-            token_mood_vec = calc_token_mood_vec(token=token)
-            token_in_lex = token_mood_vec is not None
-
-            if not token_in_lex:
-                token_mood_vec = MoodVec(energy=0.0, valence=0.0)
-            else:
-                cnt_token_in_lex()
-            prev_tokens.update({
-                token: {
-                    "mood_vec": token_mood_vec,
-                    "in_lex": token_in_lex
-                }
-            })
-
-            total_energy += token_mood_vec.energy
-            total_valence += token_mood_vec.valence
 
-    return MoodVec(energy=total_energy, valence=total_valence)
-
-
-def calc_token_mood_vec(token: str):
+def calc_token_mood_vec(token: str, lexicon: Lexicon):
     """
     The calc_token_mood_vec function takes a token (a word) as input and returns a Mood_Vec for
     that token. If the token is not found in the lexicon, it returns None.
 
     :param token:str: Tokenized word from text
+    :param lexicon:Lexicon: The lexicon of the token's language
     :return: Mood_Vec for token; None if token is not in the lexicon
 
     """
-    word_series = LEXICON[LEXICON["word"] == token]
+    return lexicon.lookup(token=token)
 
-    if word_series.empty:
-        return None
 
-    energy = float(word_series.iloc[0]["arousal"])
-    valence = float(word_series.iloc[0]["valence"])
+def calc_rating(tokens_in_lexicon: int, total_tokens: int) -> float:
+    """
+    The calc_rating function calculates the rating of a query by dividing the number of tokens in
+    the lexicon by the total number of tokens.
 
-    return MoodVec(energy=energy, valence=valence)
+    :param tokens_in_lexicon:int: Number of tokens in the lexicon
+    :param total_tokens:int: Total number of tokens
+    :return: The ratio of the number of tokens in the lexicon to the total number of tokens
+    """
+    return tokens_in_lexicon / total_tokens if total_tokens else 0.0
 
 
 #############
 
 
-def load_lexicon() -> None:
+def load_lexicon(lang: str) -> Lexicon:
     """
-    The load_lexicon function loads the lexicon file with the query's language into a pandas dataframe.
-    The function is called by the main() function and does not need to be used directly.
+    The load_lexicon function loads the lexicon of the given language into an indexed Lexicon object.
+    The compiled lexicon file is memory-mapped when it exists (see compile_lexicon in Lexicon.py), otherwise the lexicon
+    is built from its source files.
 
-    :return: None
+    :param lang:str: Encoded language code string
+    :return: Lexicon object
     """
-    global LEXICON
-    lang = QUERY_INFO_DICT["lang"]
-    lex_path = set_lex_path(lang=lang)
-    LEXICON = pd.read_csv(lex_path)
+    return Lexicon.load(lang=lang)
 
 
-def set_lex_path(lang: str):  # TODO: ADD RETURN TYPE. We can add many languages so we have to choose the right one
-    """
-    The set_lex_path function sets the lexicon path for a given language.
-    It takes one argument, lang, which is an encoded string representing the language of choice.
-    The function returns the path to that particular lexicon.
+############
+# ANALYZER #
+############
 
-    :param lang:str: Encoded language code string
-    :return: The path to the lexicon csv file for a given language
+
+class Analyzer:
+    """
+    An Analyzer item analyzes texts against the lexicons it loads on first use.
+    The lexicons are the Analyzer's only state and are never changed after they are loaded, and every analysis
+    returns its own immutable TextAnalysis, so a single warm Analyzer can serve many threads or asyncio tasks at once.
     """
-    return LEX_CSV_PATH
 
+    def __init__(self, lexicons: dict[str, Lexicon] = None):
+        self._lexicons = dict(lexicons) if lexicons is not None else {}
+        self._load_lock = Lock()
+
+    def __repr__(self):
+        return f"<Analyzer | Languages: {list(self._lexicons.keys())}>"
+
+    def get_lexicon(self, lang: str) -> Lexicon:
+        """
+        The get_lexicon function returns the lexicon of the given language, loading it on the first call.
+
+        :param lang:str: Encoded language code string
+        :return: Lexicon object
+        """
+        lexicon = self._lexicons.get(lang)
+        if lexicon is not None:
+            return lexicon
+
+        with self._load_lock:
+            if lang not in self._lexicons:
+                self._lexicons[lang] = load_lexicon(lang=lang)
+            return self._lexicons[lang]
+
+    def analyze(self, text: str | list[str]) -> TextAnalysis:
+        """
+        The analyze function takes a text and returns its mood analysis.
+        The energy and valence values are the average energy and valence across all tokens that appear in the
+        lexicon, and the analysis is rated by the ratio between tokens in the lexicon and total tokens.
+
+        :param text:str: The text that is to be analyzed
+        :return: TextAnalysis object of the text
+        """
+        lang = detect_lang(text=text)
+        tokens = tokenize(text=text)
+
+        totals_mood_vec, tokens_in_lexicon = calc_tokens_totals_vec(tokens=tokens,
+                                                                    lexicon=self.get_lexicon(lang=lang))
+        total_tokens = len(tokens)
+
+        energy = totals_mood_vec.energy / tokens_in_lexicon if tokens_in_lexicon else 0.0
+        valence = totals_mood_vec.valence / tokens_in_lexicon if tokens_in_lexicon else 0.0
+
+        return TextAnalysis(text=text if type(text) == str else tuple(text),
+                            lang=lang,
+                            total_tokens=total_tokens,
+                            tokens_in_lexicon=tokens_in_lexicon,
+                            energy=energy,
+                            valence=valence,
+                            rating=calc_rating(tokens_in_lexicon=tokens_in_lexicon, total_tokens=total_tokens))
+
+    def analyze_many(self, *args: str | list[str]) -> list[TextAnalysis]:
+        """
+        The analyze_many function accepts multiple amount of texts and returns a list of their analyses.
+
+        :param args:str: Pass an arbitrary number of texts to the function
+        :return: A list of TextAnalysis objects
+        """
+        return [self.analyze(text=text) for text in args]
+
+    def analyze_batch(self, texts: Iterable[str | list[str]] | pd.Series) -> pd.DataFrame:
+        """
+        The analyze_batch function analyzes many texts at once and returns the analyses as columns.
+        All texts are split in a single pass, and every distinct word is cleaned and looked up in the lexicon once,
+        through a vocabulary shared by the whole batch. The per-text totals are then computed with segmented
+        NumPy reductions over the flat array of tokens, instead of analyzing the texts one by one.
+
+        :param texts:Iterable: The texts to analyze, e.g. a list of strings or a DataFrame column. A text is a string
+        or a sequence of words, like in analyze. Missing values (None, NaN) are analyzed as empty texts
+        :return: A DataFrame with a row per text and the columns of a TextAnalysis (see BATCH_COLUMNS).
+        A Series input keeps its index
+        """
+        index = texts.index if isinstance(texts, pd.Series) else None
+        # Missing values (e.g. NaN or None in a DataFrame column) are analyzed as empty texts
+        texts = [text if isinstance(text, Iterable) else "" for text in texts]
+
+        split_texts = [text.split() if type(text) == str else list(text) for text in texts]
+        total_tokens = np.fromiter((len(split_text) for split_text in split_texts), dtype=np.int64, count=len(texts))
+
+        # Shared vocabulary: every distinct raw word is cleaned once
+        word_codes, vocabulary = pd.factorize(pd.Series(list(chain.from_iterable(split_texts)), dtype=object))
+        vocabulary_tokens = [clean_word(word=word) for word in vocabulary]
+        token_text_ids = np.repeat(np.arange(len(texts)), total_tokens)
+
+        langs = [detect_lang(text=text) for text in texts]
+        token_langs = np.repeat(np.array(langs, dtype=object), total_tokens)
+
+        tokens_in_lexicon = np.zeros(len(texts), dtype=np.int64)
+        energy_totals = np.zeros(len(texts), dtype=np.float64)
+        valence_totals = np.zeros(len(texts), dtype=np.float64)
+
+        for lang in set(langs):
+            lexicon = self.get_lexicon(lang=lang)
+            lang_mask = token_langs == lang if len(langs) > 1 else np.ones(len(word_codes), dtype=bool)
+
+            token_lex_ids = lexicon.lookup_ids(tokens=vocabulary_tokens)[word_codes[lang_mask]]
+            in_lexicon = token_lex_ids >= 0
+            lex_ids = token_lex_ids[in_lexicon]
+            lex_text_ids = token_text_ids[lang_mask][in_lexicon]
+
+            tokens_in_lexicon += np.bincount(lex_text_ids, minlength=len(texts))
+            energy_totals += np.bincount(lex_text_ids, weights=lexicon.arousal[lex_ids], minlength=len(texts))
+            valence_totals += np.bincount(lex_text_ids, weights=lexicon.valence[lex_ids], minlength=len(texts))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            energy = np.where(tokens_in_lexicon > 0, energy_totals / tokens_in_lexicon, 0.0)
+            valence = np.where(tokens_in_lexicon > 0, valence_totals / tokens_in_lexicon, 0.0)
+            rating = np.where(total_tokens > 0, tokens_in_lexicon / total_tokens, 0.0)
+
+        return pd.DataFrame({
+            "text": texts,
+            "lang": langs,
+            "total_tokens": total_tokens,
+            "tokens_in_lexicon": tokens_in_lexicon,
+            "energy": energy,
+            "valence": valence,
+            "rating": rating
+        }, columns=BATCH_COLUMNS, index=index)
+
+
+ANALYZER = Analyzer()
 
 ################
 # MAIN METHODS #
@@ -233,23 +283,13 @@ def set_lex_path(lang: str):  # TODO: ADD RETURN TYPE. We can add many languages
 
 def analyze_text(text: str) -> dict:
     """
-    The get_analysis function takes a string as input and returns a dictionary of information about the text.
-    The function first creates an info_dict, which is used to store all the information that will be returned.
-    It then loads the lexicon into memory, so it can be referenced by other functions. It then calculates the
-    energy and valence values of the text based on the lexicon. In addition the function rates the analysis.
-    Finally, it returns a dictionary with the entire analysis data.
+    The analyze_text function takes a string as input and returns a dictionary of information about the text.
+    Every call returns a new dictionary, see TextAnalysis.to_dict for its format.
 
     :param text:str: The text that is to be analyzed
     :return: A dictionary of the query's mood analysis
     """
-    create_info_dict(text=text)
-    try:
-        LEXICON
-    except NameError:
-        load_lexicon()
-    set_mood_info()
-
-    return QUERY_INFO_DICT
+    return ANALYZER.analyze(text=text).to_dict()
 
 
 def multiple_texts_analysis(*args: str) -> list[dict]:
@@ -260,10 +300,15 @@ def multiple_texts_analysis(*args: str) -> list[dict]:
     :param args:str: Pass an arbitrary number of strings to the function
     :return: A list of dictionaries
     """
-    analyzed_list = []
+    return [analysis.to_dict() for analysis in ANALYZER.analyze_many(*args)]
 
-    for text in args:
-        text_analysis = analyze_text(text=text)
-        analyzed_list.append(text_analysis)
 
-    return analyzed_list
+def batch_texts_analysis(texts: Iterable[str] | pd.Series) -> pd.DataFrame:
+    """
+    The batch_texts_analysis function analyzes a large amount of texts at once, e.g. a DataFrame column of stored
+    entries, and returns a DataFrame with a row per text (see Analyzer.analyze_batch).
+
+    :param texts:Iterable: The texts to analyze
+    :return: A DataFrame of the texts' mood analyses
+    """
+    return ANALYZER.analyze_batch(texts=texts)
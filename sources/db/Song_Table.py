@@ -0,0 +1,106 @@
+import numpy as np
+from typing import Sequence
+from items.Song import Song
+from items.MoodVec import MoodVec
+from configs.Array_Store import write_arrays, read_arrays, StringColumn
+
+################
+# A columnar table of songs' metadata.
+#
+# Every song attribute is a column: the mood values are float32 arrays, and the texts are packed string columns
+# (see Array_Store.py). A saved table is memory-mapped when it is loaded, so opening a table of millions of songs
+# reads nothing but its header, and forked workers share its pages. Songs are built one at a time, on access.
+################
+
+SONG_TABLE_FORMAT = "song_table"
+TEXT_COLUMNS = ("spotify_ID", "title", "artist", "href")
+
+
+def _to_text(value) -> str:
+    # Missing values (None, NaN) are stored as empty strings
+    return value if isinstance(value, str) else ""
+
+
+class SongTable:
+    """
+    A SongTable item holds the metadata of many songs as columns. Row i of the table is the i-th song it was built from.
+    """
+
+    def __init__(self, energy: np.ndarray, valence: np.ndarray, texts: dict[str, StringColumn]):
+        self.energy = np.asarray(energy, dtype=np.float32)
+        self.valence = np.asarray(valence, dtype=np.float32)
+        self.texts = texts
+
+        assert self.energy.shape == self.valence.shape and self.energy.ndim == 1
+        assert set(texts.keys()) == set(TEXT_COLUMNS)
+        assert all(len(column) == len(self.energy) for column in texts.values())
+
+    def __repr__(self):
+        return f"<SongTable: {len(self)} songs>"
+
+    def __len__(self):
+        return len(self.energy)
+
+    def __getitem__(self, row: int) -> Song:
+        return self.get_song(row=row)
+
+    @classmethod
+    def from_songs(cls, songs: Sequence[Song]):
+        energy = np.fromiter((song.mood_vec.energy for song in songs), dtype=np.float32, count=len(songs))
+        valence = np.fromiter((song.mood_vec.valence for song in songs), dtype=np.float32, count=len(songs))
+        texts = {column: StringColumn.from_strings(strings=[_to_text(getattr(song, column)) for song in songs])
+                 for column in TEXT_COLUMNS}
+        return cls(energy=energy, valence=valence, texts=texts)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        The from_dataframe function builds the table from a songs' DataFrame, like the one created in
+        Demo_50_songs_run.py. Text columns that are not in the DataFrame are left empty.
+
+        :param df:pd.DataFrame: DataFrame with energy and valence columns, and optionally the columns of TEXT_COLUMNS
+        :return: SongTable object
+        """
+        texts = {column: StringColumn.from_strings(
+                    strings=[_to_text(value) for value in df[column].tolist()] if column in df.columns
+                    else [""] * len(df))
+                 for column in TEXT_COLUMNS}
+        return cls(energy=df["energy"].to_numpy(), valence=df["valence"].to_numpy(), texts=texts)
+
+    def save(self, path: str) -> None:
+        arrays = {"energy": self.energy, "valence": self.valence}
+        for column in TEXT_COLUMNS:
+            arrays.update(self.texts[column].to_arrays(name=column))
+
+        write_arrays(path=path, arrays=arrays, meta={"format": SONG_TABLE_FORMAT, "songs": len(self)})
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        The load function memory-maps a table saved by save.
+
+        :param path:str: Path to the table file
+        :return: SongTable object
+        """
+        arrays, meta = read_arrays(path=path)
+        if meta.get("format") != SONG_TABLE_FORMAT:
+            raise ValueError(f"{path} is not a song table file")
+
+        return cls(energy=arrays["energy"], valence=arrays["valence"],
+                   texts={column: StringColumn.from_arrays(arrays=arrays, name=column) for column in TEXT_COLUMNS})
+
+    def get_id(self, row: int) -> str:
+        return self.texts["spotify_ID"][row] or None
+
+    def get_song(self, row: int) -> Song:
+        """
+        The get_song function builds the Song of a row. Empty Spotify ids and hrefs are returned as None.
+
+        :param row:int: Row of the song in the table
+        :return: Song object
+        """
+        return Song(title=self.texts["title"][row],
+                    artist=self.texts["artist"][row],
+                    spotify_ID=self.texts["spotify_ID"][row] or None,
+                    href=self.texts["href"][row] or None,
+                    mood_vec=MoodVec(energy=float(self.energy[row]), valence=float(self.valence[row])))
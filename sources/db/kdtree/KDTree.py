@@ -0,0 +1,261 @@
+import heapq
+from typing import Any, Sequence
+import numpy as np
+
+
+################
+# An array-backed k-d tree over n-dimensional mood vectors, e.g. (valence, arousal, dominance) of the lexicons, or
+# Spotify's (energy, valence, danceability, tempo).
+#
+# Distances are weighted: the distance between p and q is sqrt(sum(w_i * (p_i - q_i) ** 2)). The points are stored
+# unweighted, so the weights of the tree are only its defaults - every query may bring its own weights, and the
+# bounding boxes still bound its distances. Axes of other scales (tempo in BPM) are balanced by their weights.
+#
+# Like StaticQuadtree, the tree is a handful of flat arrays:
+#   - points:      (N, D)  float32 - the points, in the order of the tree's leaves
+#   - point_rows:  (N,)    int64   - the input row of every sorted point
+#   - node_range:  (M, 2)  int64   - the [start, end) range of sorted points under every node
+#   - node_bounds: (M, 2D) float32 - tight bounding box of every node (D minimums, then D maximums)
+#   - node_child:  (M, 2)  int64   - offset of the first child and the number of children (0 for leaves)
+#
+# A node is split at the median of the axis along which its points spread the most (weighted), so the tree is
+# balanced. Nodes are stored in breadth-first order, so the children of a node are contiguous.
+################
+
+DEFAULT_LEAF_SIZE = 16
+
+
+class KDTree:
+    """
+    A KDTree is a compact, read-only k-d tree over points of any number of dimensions, built in bulk from an array.
+    Queries return rows of the input array, like StaticQuadtree's.
+    """
+
+    def __init__(self, points: np.ndarray,
+                 weights: Sequence[float] = None,
+                 ids: np.ndarray = None,
+                 data: Sequence = None,
+                 leaf_size: int = DEFAULT_LEAF_SIZE):
+
+        # A copy, as the build sorts the points in place
+        points = np.array(points, dtype=np.float32)
+        assert points.ndim == 2 and points.shape[1] > 0
+
+        self.dimensions = points.shape[1]
+        self.weights = self._get_weights(weights=weights)
+        self.ids = None if ids is None else np.asarray(ids)
+        self.data = data
+        self.leaf_size = max(int(leaf_size), 1)
+
+        self._build_nodes(points=points)
+
+    def __repr__(self):
+        return f"<KDTree | Points: {len(self)}, Dimensions: {self.dimensions}, Nodes: {len(self.node_range)}>"
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def from_dataframe(cls, df, columns: Sequence[str], weights: Sequence[float] = None, id_column: str = None,
+                       leaf_size: int = DEFAULT_LEAF_SIZE):
+        """
+        The from_dataframe function builds the tree from columns of a DataFrame.
+
+        :param df:pd.DataFrame: The songs' (or words') DataFrame
+        :param columns:Sequence[str]: The columns of the tree's axes, e.g. ("energy", "valence", "danceability")
+        :param weights:Sequence[float]: Optional weight of every column, 1.0 by default
+        :param id_column:str: Optional column with the rows' ids
+        :param leaf_size:int: Maximal number of points in a leaf
+        :return: KDTree object
+        """
+        return cls(points=df[list(columns)].to_numpy(dtype=np.float32), weights=weights,
+                   ids=None if id_column is None else df[id_column].to_numpy(),
+                   leaf_size=leaf_size)
+
+    def _get_weights(self, weights: Sequence[float] = None) -> np.ndarray:
+        if weights is None:
+            return np.ones(self.dimensions, dtype=np.float64)
+
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (self.dimensions,) or np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError(f"Expected {self.dimensions} non-negative weights, got {weights.tolist()}")
+        return weights
+
+    #################
+    # BUILD METHODS #
+    #################
+
+    def _build_nodes(self, points: np.ndarray) -> None:
+        """
+        The _build_nodes function splits the points top-down, breadth first. Every node's range of the sorted points
+        is partitioned in place around its median, along the axis of the largest weighted spread. Nodes with at most
+        leaf_size points, or whose points are all equal, become leaves.
+
+        :param points:np.ndarray: (N, D) array of the points
+        :return: None
+        """
+        point_rows = np.arange(len(points), dtype=np.int64)
+        node_range = [(0, len(points))] if len(points) > 0 else []
+        node_bounds = []
+        node_child = []
+
+        node = 0
+        while node < len(node_range):
+            start, end = node_range[node]
+            node_points = points[start:end]
+            mins, maxs = node_points.min(axis=0), node_points.max(axis=0)
+            node_bounds.append(np.concatenate((mins, maxs)))
+
+            spreads = (maxs.astype(np.float64) - mins) ** 2 * self.weights
+            axis = int(np.argmax(spreads))
+            if end - start <= self.leaf_size or spreads[axis] == 0:
+                node_child.append((0, 0))
+                node += 1
+                continue
+
+            middle = (end - start) // 2
+            order = np.argpartition(node_points[:, axis], middle)
+            points[start:end] = node_points[order]
+            point_rows[start:end] = point_rows[start:end][order]
+
+            first_child = len(node_range)
+            node_range.extend([(start, start + middle), (start + middle, end)])
+            node_child.append((first_child, 2))
+            node += 1
+
+        self.points = points
+        self.point_rows = point_rows
+        self.node_range = np.array(node_range, dtype=np.int64).reshape(-1, 2)
+        self.node_bounds = np.array(node_bounds, dtype=np.float32).reshape(-1, 2 * self.dimensions)
+        self.node_child = np.array(node_child, dtype=np.int64).reshape(-1, 2)
+
+    #################
+    # QUERY METHODS #
+    #################
+
+    def _search(self, query: list[float], weights: np.ndarray, k: int = None,
+                radius: float = None) -> list[tuple[float, int]]:
+        """
+        The _search function finds the k nearest points to the query, or the points within the radius, with a
+        best-first traversal: nodes are visited in the order of their bounding box's distance from the query, and the
+        search stops once the nearest unvisited node is farther than the k-th nearest point found (or the radius).
+
+        :return: A list of (squared distance, sorted point position) tuples, nearest first
+        """
+        if len(self.points) == 0 or (k is not None and k <= 0):
+            return []
+
+        dimensions = self.dimensions
+        query_array = np.asarray(query, dtype=np.float64)
+        axis_weights = weights.tolist()
+        squared_radius = np.inf if radius is None else radius * radius
+
+        nodes_heap = [(0.0, 0)]
+        best = []  # Max-heap of the nearest points: (-squared distance, position)
+
+        while nodes_heap:
+            node_distance, node = heapq.heappop(nodes_heap)
+            if node_distance > squared_radius or (k is not None and len(best) == k and node_distance > -best[0][0]):
+                break
+
+            first_child, children_count = self.node_child[node].tolist()
+
+            if children_count == 0:
+                start, end = self.node_range[node].tolist()
+                leaf_distances = ((self.points[start:end] - query_array) ** 2) @ weights
+                for position, point_distance in enumerate(leaf_distances.tolist(), start=start):
+                    if point_distance > squared_radius:
+                        continue
+                    item = (-point_distance, position)
+                    if k is None or len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+
+            for child, bounds in enumerate(self.node_bounds[first_child:first_child + children_count].tolist(),
+                                           start=first_child):
+                child_distance = 0.0
+                for axis in range(dimensions):
+                    value, low, high = query[axis], bounds[axis], bounds[dimensions + axis]
+                    delta = low - value if value < low else (value - high if value > high else 0.0)
+                    child_distance += axis_weights[axis] * delta * delta
+                if child_distance <= squared_radius and (k is None or len(best) < k or child_distance <= -best[0][0]):
+                    heapq.heappush(nodes_heap, (child_distance, child))
+
+        return sorted((-distance, position) for distance, position in best)
+
+    def _to_query(self, point: Sequence[float]) -> list[float]:
+        query = np.asarray(point, dtype=np.float64).reshape(-1)
+        if len(query) != self.dimensions:
+            raise ValueError(f"Expected a point of {self.dimensions} dimensions, got {len(query)}")
+        return query.tolist()
+
+    def _to_result(self, found: list[tuple[float, int]]) -> tuple[np.ndarray, np.ndarray]:
+        positions = np.array([position for _, position in found], dtype=np.int64)
+        distances = np.sqrt(np.array([distance for distance, _ in found], dtype=np.float64))
+        return self.point_rows[positions], distances
+
+    def query(self, point: Sequence[float], k: int = 1,
+              weights: Sequence[float] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query function finds the k nearest points to a point.
+
+        :param point:Sequence[float]: The query point, a value per axis
+        :param k:int: Number of neighbors
+        :param weights:Sequence[float]: Optional weights of this query, the tree's weights by default
+        :return: A tuple of the input rows of the neighbors (0) and their distances (1), nearest first
+        """
+        weights = self.weights if weights is None else self._get_weights(weights=weights)
+        return self._to_result(found=self._search(query=self._to_query(point=point), weights=weights, k=k))
+
+    def query_radius(self, point: Sequence[float], radius: float,
+                     weights: Sequence[float] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query_radius function finds all the points within a (weighted) distance from a point.
+
+        :param point:Sequence[float]: The query point, a value per axis
+        :param radius:float: Maximal distance from the point
+        :param weights:Sequence[float]: Optional weights of this query, the tree's weights by default
+        :return: A tuple of the input rows of the points (0) and their distances (1), nearest first
+        """
+        weights = self.weights if weights is None else self._get_weights(weights=weights)
+        return self._to_result(found=self._search(query=self._to_query(point=point), weights=weights, radius=radius))
+
+    def query_batch(self, points: np.ndarray, k: int = 1,
+                    weights: Sequence[float] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query_batch function finds the k nearest points to each of many query points.
+
+        :param points:np.ndarray: (N, D) array of query points
+        :param k:int: Number of neighbors
+        :param weights:Sequence[float]: Optional weights of the queries, the tree's weights by default
+        :return: A tuple of (N, k) arrays - the input rows of the neighbors (0) and their distances (1), nearest first.
+        When the tree has fewer than k points, the missing neighbors get row -1 and an infinite distance
+        """
+        weights = self.weights if weights is None else self._get_weights(weights=weights)
+        queries = np.asarray(points, dtype=np.float64).reshape(-1, self.dimensions)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float64)
+
+        for query, query_point in enumerate(queries.tolist()):
+            query_rows, query_distances = self._to_result(found=self._search(query=query_point, weights=weights, k=k))
+            rows[query, :len(query_rows)] = query_rows
+            distances[query, :len(query_rows)] = query_distances
+
+        return rows, distances
+
+    def get_item(self, row: int) -> Any:
+        """
+        The get_item function returns the item of an input row: its data if the tree has data, its id if the tree has
+        ids, and the row itself otherwise.
+        """
+        if self.data is not None:
+            return self.data[row]
+        if self.ids is not None:
+            return self.ids[row]
+        return row
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.points, self.point_rows, self.node_range,
+                                              self.node_bounds, self.node_child))
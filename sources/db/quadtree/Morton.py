@@ -0,0 +1,46 @@
+import numpy as np
+
+
+################
+# Morton (Z-order) codes of points in the unit square.
+#
+# The code of a point interleaves the bits of its quantized x (energy) and y (valence), x first, so the top 2 * L bits
+# of a code are the path to the quadtree cell of depth L that contains the point, and sorting points by their codes
+# puts the points of every cell next to each other. Every pair of bits is the quadrant of the next level:
+# 0 - south west, 1 - north west, 2 - south east, 3 - north east.
+################
+
+MORTON_BITS = 32  # Bits per axis
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """
+    The spread_bits function spreads the lower 32 bits of every value to the even bits of a uint64.
+
+    :param values:np.ndarray: Non-negative integer values smaller than 2 ** 32
+    :return: uint64 array
+    """
+    spread = values.astype(np.uint64)
+    spread = (spread | (spread << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    spread = (spread | (spread << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    spread = (spread | (spread << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    spread = (spread | (spread << np.uint64(2))) & np.uint64(0x3333333333333333)
+    spread = (spread | (spread << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return spread
+
+
+def morton_codes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    The morton_codes function computes the Z-order code of points in the unit square.
+    Each axis is quantized to MORTON_BITS bits, so the top 2 * L bits of a code identify the quadtree cell of depth L
+    that contains the point. Points outside the unit square are clamped to its border cells.
+
+    :param x:np.ndarray: x (energy) values
+    :param y:np.ndarray: y (valence) values
+    :return: uint64 array of the codes
+    """
+    scale = float(2 ** MORTON_BITS)
+    max_cell = scale - 1
+    cell_x = np.clip(np.floor(np.asarray(x, dtype=np.float64) * scale), 0, max_cell)
+    cell_y = np.clip(np.floor(np.asarray(y, dtype=np.float64) * scale), 0, max_cell)
+    return (spread_bits(cell_x) << np.uint64(1)) | spread_bits(cell_y)
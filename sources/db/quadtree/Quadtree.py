@@ -1,7 +1,13 @@
-from copy import deepcopy
-from typing import Any
-from numpy import hypot as distance
+import heapq
+from bisect import bisect_left
+from collections import deque
+from itertools import count
+from typing import Any, Sequence
+from math import hypot as distance, ceil, log2
+import numpy as np
 from items.Song import Song
+from items.MoodVec import MoodVec
+from sources.db.quadtree.Morton import MORTON_BITS, morton_codes
 
 
 ################
@@ -11,8 +17,14 @@ from items.Song import Song
 # - https://geidav.wordpress.com/2017/12/02/advanced-octrees-4-finding-neighbor-nodes/ (https://github.com/geidav/quadtree-neighbor-finding/blob/b5fc4527271b4420eaf8cfb4ec66926f08cb881f/neighbors.py)
 #
 # Visualization Example: https://ericandrewlewis.github.io/how-a-quadtree-works/
+#
+# The NodeData are kept in buckets of the leaves. A full leaf is split when new data arrives, unless its frame is
+# already at the minimal cell size - then its bucket grows, so duplicated positions never split the tree endlessly.
 ################
 
+DEFAULT_BUCKET_CAPACITY = 8
+DEFAULT_MIN_CELL_SIZE = 1e-6
+
 
 class Direction:
     NW = 0
@@ -20,6 +32,9 @@ class Direction:
     SE = 2
     SW = 3
 
+    # The direction of every Morton code quadrant (see Morton.py)
+    morton_quadrants = (SW, NW, SE, NE)
+
     neighboring = {
         "N": (SE, SW),
         "S": (NE, NW),
@@ -99,6 +114,7 @@ class Point:
     A Point item represents a point in a 2D space by (x,y).
     Each Point has a payload of a Song object.
     """
+    __slots__ = ("x", "y")
 
     def __init__(self, x: float = 0.00, y: float = 0.00):
         self.x, self.y = x, y
@@ -112,14 +128,6 @@ class Point:
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y
 
-    def __deepcopy__(self, memo):
-        cls = self.__class__
-        result = cls.__new__(cls)
-        memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, deepcopy(v, memo))
-        return result
-
     def distance_to(self, other):
         try:
             other_x, other_y = other.x, other.y
@@ -163,7 +171,9 @@ class Frame:
         cy - rectangle's center y value
         w - width
         h - height
+    A tree holds a Frame per node, so a Frame holds nothing but its corners (the colors of draw are not kept).
     """
+    __slots__ = ("top_left", "bottom_right")
 
     def __init__(self, top_left: Point = Point(x=0.0, y=1.0),
                  bottom_right: Point = Point(x=1.0, y=0.0)):
@@ -171,11 +181,8 @@ class Frame:
         self.top_left = top_left
         self.bottom_right = bottom_right
 
-        # Debug method
-        self.color = ""
-
     def __repr__(self):
-        return f"TL: {str(self.top_left)}, BR: {str(self.bottom_right)}, Color: {self.color}"
+        return f"TL: {str(self.top_left)}, BR: {str(self.bottom_right)}"
 
     def __str__(self):
         return self.__repr__()
@@ -189,6 +196,16 @@ class Frame:
         return (self.top_left.x <= point.x < self.bottom_right.x and
                 self.bottom_right.y <= point.y < self.top_left.y)
 
+    def distance_to(self, point: Point) -> float:
+        """
+        The distance_to method measures the minimal distance between the Rectangle and a given point.
+        :param point: A Point object.
+        :return: 0.0 if the point is inside the borders, otherwise the distance to the closest border point.
+        """
+        dx = max(self.top_left.x - point.x, 0.0, point.x - self.bottom_right.x)
+        dy = max(self.bottom_right.y - point.y, 0.0, point.y - self.top_left.y)
+        return distance(dx, dy)
+
     def find_location_in_frame(self, point: Point) -> int:
         is_south = self.bottom_right.y <= point.y < ((self.bottom_right.y + self.top_left.y) / 2)
         is_west = self.top_left.x <= point.x < ((self.top_left.x + self.bottom_right.x) / 2)
@@ -220,26 +237,22 @@ class Frame:
         - sw - Southwestern child (Bottom-Left)
         :return: None.
         """
-        top_left = Point(x=self.top_left.x, y=self.top_left.y)
-        bottom_right = Point(x=self.bottom_right.x, y=self.bottom_right.y)
-
-        x_step = (bottom_right.x - top_left.x) / 2
-        y_step = (top_left.y - bottom_right.y) / 2
-
-        match direction:
-            case Direction.NW:
-                bottom_right.x -= x_step
-                bottom_right.y += y_step
-            case Direction.NE:
-                top_left.x += x_step
-                bottom_right.y += y_step
-            case Direction.SE:
-                top_left.x += x_step
-                top_left.y -= y_step
-            case Direction.SW:
-                top_left.y -= y_step
-                bottom_right.x -= x_step
-
+        left, top = self.top_left.x, self.top_left.y
+        right, bottom = self.bottom_right.x, self.bottom_right.y
+
+        x_step = (right - left) / 2
+        y_step = (top - bottom) / 2
+
+        if direction == Direction.NW:
+            right, bottom = right - x_step, bottom + y_step
+        elif direction == Direction.NE:
+            left, bottom = left + x_step, bottom + y_step
+        elif direction == Direction.SE:
+            left, top = left + x_step, top - y_step
+        elif direction == Direction.SW:
+            top, right = top - y_step, right - x_step
+
+        top_left, bottom_right = Point(x=left, y=top), Point(x=right, y=bottom)
         return Frame(top_left=top_left, bottom_right=bottom_right)
 
     def get_top_right(self) -> Point:
@@ -265,7 +278,11 @@ class Frame:
             case "#bcbd22": return "yellow"
             case "#17becf": return "cyan"
 
-    def draw(self, ax):
+    def draw(self, ax) -> str:
+        """
+        The draw method plots the frame's borders on Matplotlib Axes ax.
+        :return: The name of the color the frame was drawn with.
+        """
         top_left = Point(x=self.top_left.x, y=self.top_left.y)
         bottom_left = Point(x=self.top_left.x, y=self.bottom_right.y)
 
@@ -275,44 +292,40 @@ class Frame:
         p = ax.plot([top_left.x, top_right.x, bottom_right.x, bottom_left.x, top_left.x],
                     [top_left.y, top_right.y, bottom_right.y, bottom_left.y, top_left.y])
 
-        self.color = Frame.convert_color_to_text(hex_color=p[-1].get_color())
+        return Frame.convert_color_to_text(hex_color=p[-1].get_color())
 
 
 class NodeData:
+    __slots__ = ("position", "data", "node")
 
     def __init__(self, position: Point, data: Song = None):
         self.position = position
         self.data = data
+        self.node = None  # The Node that holds this NodeData
 
     def __repr__(self):
         if self.data is None:
             return f"<{repr(self.position)}"
+        if not isinstance(self.data, Song):
+            return f"<{str(self.position)} | {self.data}>"
         return f"<{str(self.position)} | {self.data.title} by: {self.data.artist}>"
 
     def __str__(self):
         return self.__repr__()
 
-    def __deepcopy__(self, memo):
-        cls = self.__class__
-        result = cls.__new__(cls)
-        memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, deepcopy(v, memo))
-        return result
-
 
 class Node:
+    __slots__ = ("frame", "bucket", "children", "parent", "is_divided", "depth")
 
     def __init__(self, frame: Frame = None, depth: int = 0):
         self.frame = frame
 
-        self.data = None
+        self.bucket = []  # The NodeData of a leaf
         self.children = [None] * 4
         self.parent = None
         self.is_divided = False
 
         self.depth = depth
-        self.external_point = None
 
     def __repr__(self):
         has_nw = self.children[Direction.NW] is not None
@@ -328,8 +341,22 @@ class Node:
         data = self.data if not None else "No Data"
         return f"Depth: {self.depth}; Frame: {self.frame}; Data: {data}"
 
+    @property
+    def data(self):
+        """
+        The first NodeData of the node's bucket, or None for an empty bucket. Kept for the neighbor finding methods,
+        which see a single NodeData per node.
+        """
+        return self.bucket[0] if self.bucket else None
+
+    @data.setter
+    def data(self, node_data):
+        # Used by dummy nodes, the NodeData keeps its own node
+        self.bucket = [] if node_data is None else [node_data]
+
     def is_leaf(self):
-        return self.children == [None] * 4
+        # is_divided is kept up to date by add_child and collapse, so no children list is built
+        return not self.is_divided
 
     def add_child(self, direction: int, is_dummy: bool = False):
         child_node = Node(depth=self.depth + 1)
@@ -342,8 +369,15 @@ class Node:
 
         return child_node
 
-    def insert(self, node_data):
-
+    def insert(self, node_data, capacity: int = DEFAULT_BUCKET_CAPACITY, max_depth: int = MORTON_BITS):
+        """
+        The insert method adds a NodeData to the bucket of the leaf that contains its position.
+        A full leaf is split and its bucket moves to its children, unless it is at max_depth.
+        :param node_data: A NodeData object.
+        :param capacity: Number of NodeData a leaf holds before it is split.
+        :param max_depth: The depth of the smallest leaves, which hold any number of NodeData.
+        :return: None.
+        """
         assert isinstance(node_data, NodeData)
 
         # Current NodeData's position is not in the current Node's frame
@@ -351,85 +385,128 @@ class Node:
             print("Not in frame!")
             return
 
-        # Node is not divided
-        if not self.is_divided:
-            # Node has no data
-            if self.data is None:  # Stop Condition
-                self.data = node_data
+        node = self
+        while True:
+            if node.is_divided:
+                direction = node.frame.find_location_in_frame(point=node_data.position)
+                child = node.children[direction]
+                node = child if child is not None else node.add_child(direction=direction)
+                continue
+
+            if len(node.bucket) < capacity or node.depth >= max_depth:
+                node.add_data(node_data=node_data)
                 return
 
-            # Node has data
-            else:
-                nd_direction = self.frame.find_location_in_frame(point=node_data.position)
-                data_direction = self.frame.find_location_in_frame(point=self.data.position)
+            node.split()
 
-                child = self.add_child(direction=nd_direction)  # By reference?
-                assert isinstance(child, Node)
+    def split(self):
+        # Moves the bucket's NodeData references to the children, the Songs are never copied
+        for node_data in self.bucket:
+            direction = self.frame.find_location_in_frame(point=node_data.position)
+            child = self.children[direction]
+            if child is None:
+                child = self.add_child(direction=direction)
+            child.add_data(node_data=node_data)
 
-                # Same direction
-                if nd_direction == data_direction:
-                    self.delegate_data(child=child)
-                    child.insert(node_data=node_data)
-                    return
+        self.bucket = []
 
-                # New direction
-                else:
-                    child.data = node_data
-                    return
+    def add_data(self, node_data):
+        self.bucket.append(node_data)
+        node_data.node = self
 
-        # Node is divided
-        else:
-            nd_direction = self.frame.find_location_in_frame(point=node_data.position)
-            candidate_child = self.children[nd_direction]
-
-            # Node has data
-            if self.data is not None:
-
-                # Has a child with the same direction as node_data
-                if candidate_child is not None:
-                    assert isinstance(candidate_child, Node)
-                    candidate_child.insert(node_data=node_data)
-                    return
-
-                # Does not have a child with the same direction as node_data
-                else:
-                    data_direction = self.frame.find_location_in_frame(point=self.data.position)
-                    child = self.add_child(direction=nd_direction)
-                    assert isinstance(child, Node)
-
-                    # The node's (self) data is in the same direction as node_data's direction
-                    if nd_direction == data_direction:
-                        self.delegate_data(child=child)
-                        child.insert(node_data=node_data)
-                        return
-
-                    # Moves node_data to the new child
-                    else:
-                        child.data = node_data
-                        return
-
-            # Node does not have data
-            else:
+    def remove_data(self, node_data):
+        self.bucket.remove(node_data)
+        node_data.node = None
+
+    def collapse(self, capacity: int = DEFAULT_BUCKET_CAPACITY):
+        """
+        The collapse method fixes up the tree above a leaf whose data was removed: empty leaves are detached from their
+        parents, and a node whose children are leaves with at most capacity NodeData altogether takes their NodeData
+        and becomes a leaf. The nodes are visited from the leaf up to the first ancestor that can't be merged.
+        :param capacity: Number of NodeData a leaf holds.
+        :return: None.
+        """
+        node = self
+        while node is not None:
+            children = [child for child in node.children if child is not None]
+
+            # Empty leaf
+            if not children and not node.bucket and node.parent is not None:
+                parent = node.parent
+                parent.children[parent.children.index(node)] = None
+                parent.is_divided = any(child is not None for child in parent.children)
+                node = parent
+                continue
+
+            # Leaf that still holds data, its parent may now be underfull
+            if not children:
+                node = node.parent
+                continue
+
+            # Underfull node
+            if children and all(child.is_leaf() for child in children) and \
+                    sum(len(child.bucket) for child in children) <= capacity:
+                for child in children:
+                    for node_data in child.bucket:
+                        node.add_data(node_data=node_data)
+                node.children = [None] * 4
+                node.is_divided = False
+                node = node.parent
+                continue
+
+            return
+
+    def build(self, node_datas: list, codes: list[int], capacity: int = DEFAULT_BUCKET_CAPACITY,
+              max_depth: int = MORTON_BITS):
+        """
+        The build method fills an empty node, top-down, with NodeData sorted by their Morton codes (see Morton.py).
+        The codes of the points under a node are a contiguous range, so a child's points are found with binary
+        searches instead of inserting the points one by one. A range of at most capacity points, or a range at
+        max_depth, becomes a leaf's bucket, like in insert.
+        :param node_datas: NodeData objects, sorted by their codes.
+        :param codes: Morton codes of the NodeData positions, sorted.
+        :param capacity: Number of NodeData a leaf holds.
+        :param max_depth: The depth of the smallest leaves, at most MORTON_BITS.
+        :return: None.
+        """
+        nodes_stack = [(self, 0, len(codes))] if codes else []
+
+        while nodes_stack:
+            node, start, end = nodes_stack.pop()
+
+            if end - start <= capacity or node.depth >= max_depth:
+                for node_data in node_datas[start:end]:
+                    node.add_data(node_data=node_data)
+                continue
 
-                # Does not have a child with the same direction as node_data
-                if candidate_child is None:
-                    self.data = node_data
-                    return
+            # The points share their cells down to the first level at which the first and last codes differ
+            split_level = min((64 - (codes[start] ^ codes[end - 1]).bit_length()) // 2, max_depth)
+            for level in range(node.depth, split_level):
+                quadrant = (codes[start] >> 2 * (MORTON_BITS - 1 - level)) & 3
+                node = node.add_child(direction=Direction.morton_quadrants[quadrant])
 
-                # Has a child with the same direction as node_data
-                else:
-                    candidate_child.insert(node_data=node_data)
-                    return
+            if split_level == max_depth:
+                nodes_stack.append((node, start, end))
+                continue
 
-    def delegate_data(self, child):
-        child.data = deepcopy(self.data)
-        self.data = None
+            shift = 2 * (MORTON_BITS - 1 - split_level)
+            prefix = (codes[start] >> (shift + 2)) << (shift + 2)
+            borders = [start, *(bisect_left(codes, prefix + (quadrant << shift), start, end) for quadrant in (1, 2, 3)),
+                       end]
+
+            for quadrant, (child_start, child_end) in enumerate(zip(borders[:-1], borders[1:])):
+                if child_end > child_start:
+                    child = node.add_child(direction=Direction.morton_quadrants[quadrant])
+                    nodes_stack.append((child, child_start, child_end))
 
     def find_containing_node(self, point: Point):
-        point_direction = self.frame.find_location_in_frame(point=point)
-        if self.children[point_direction]:
-            return self.children[point_direction].find_containing_node(point=point)
-        return self
+        node = self
+        while node.is_divided:
+            child = node.children[node.frame.find_location_in_frame(point=point)]
+            if child is None:
+                break
+            node = child
+        return node
 
     def find_neighbors(self, children_directions: list[tuple]):
 
@@ -456,8 +533,6 @@ class Node:
         return neighbors
 
     def get_relative_direction_of_children_to_point(self, point: Point) -> list[tuple]:
-        assert isinstance(self.external_point, Point)
-
         child_and_directions_list = []
 
         for child_direction, child in enumerate(self.children):
@@ -477,8 +552,8 @@ class Node:
 
 
 
-    def find_candidates(self) -> list:
-        children_directions = self.get_relative_direction_of_children_to_point(point=self.external_point)
+    def find_candidates(self, point: Point) -> list:
+        children_directions = self.get_relative_direction_of_children_to_point(point=point)
         neighbors_candidates = self.find_neighbors(children_directions=children_directions)
         descendants_candidates = self.find_relevant_descendants(children_directions=children_directions)
 
@@ -486,73 +561,78 @@ class Node:
                 else [*descendants_candidates, *neighbors_candidates])
 
     def get_neighbor_of_greater_or_equal_size(self, direction: str):
+        """
+        The get_neighbor_of_greater_or_equal_size method finds the neighbor in a direction that is at least as large as
+        the node. It walks up to the first ancestor with a sibling in the direction, then walks back down, mirroring
+        the path, as long as the neighbor has children.
+        :param direction: "N", "S", "W" or "E".
+        :return: The neighbor Node, a dummy Node of its data, or None at the border of the tree.
+        """
         mirrored_directions = Direction.neighboring[direction]
 
-        if self.parent is None:  # Reached root?
-            return None
-
-        if self.parent.children[mirrored_directions[0]] == self:
-            return (self.parent.children[Direction.opposite_of(direction=mirrored_directions[0], relative_to=direction)]
-                    if self.parent.children[Direction.opposite_of(direction=mirrored_directions[0], relative_to=direction)] is not None
-                    else self.parent)
-
-        if self.parent.children[mirrored_directions[1]] == self:
-            return (self.parent.children[Direction.opposite_of(direction=mirrored_directions[1], relative_to=direction)]
-                    if self.parent.children[Direction.opposite_of(direction=mirrored_directions[1], relative_to=direction)] is not None
-                    else self.parent)
-
-        node = self.parent.get_neighbor_of_greater_or_equal_size(direction=direction)
-        if node is None or node.is_leaf():
-            return node
-
-        if self.parent.children[Direction.opposite_of(direction=mirrored_directions[0], relative_to=direction)] == self:
-            if node.data is not None:
-                if node.frame.find_location_in_frame(point=node.data.position) == mirrored_directions[0]:
-                    dummy_node = node.add_child(direction=mirrored_directions[0], is_dummy=True)
-                    dummy_node.data = deepcopy(node.data)
-                    return dummy_node
-            return node.children[mirrored_directions[0]]
-
-        if self.parent.children[Direction.opposite_of(direction=mirrored_directions[1], relative_to=direction)] == self:
-            if node.data is not None:
-                if node.frame.find_location_in_frame(point=node.data.position) == mirrored_directions[1]:
-                    dummy_node = node.add_child(direction=mirrored_directions[1], is_dummy=True)
-                    dummy_node.data = deepcopy(node.data)
-                    return dummy_node
-            return node.children[mirrored_directions[1]]
-        #
-        # if node.children[mirrored_directions[1]] is None and node.data is not None:
-        #     dummy_node = node.add_child(direction=mirrored_directions[1], is_dummy=True)
-        #     dummy_node.data = deepcopy(self.data)
-        #     return dummy_node
-
-        return node.children[mirrored_directions[0]]
+        # Up: the nodes under the common ancestor are mirrored on the way down
+        path = []
+        node = self
+        while True:
+            parent = node.parent
+            if parent is None:  # Reached root?
+                return None
+
+            if parent.children[mirrored_directions[0]] is node or parent.children[mirrored_directions[1]] is node:
+                mirrored_direction = (mirrored_directions[0] if parent.children[mirrored_directions[0]] is node
+                                      else mirrored_directions[1])
+                sibling = parent.children[Direction.opposite_of(direction=mirrored_direction, relative_to=direction)]
+                neighbor = sibling if sibling is not None else parent
+                break
+
+            path.append(node)
+            node = parent
+
+        # Down
+        for node in reversed(path):
+            if neighbor is None or neighbor.is_leaf():
+                return neighbor
+
+            mirrored_direction = mirrored_directions[0]
+            if node.parent.children[Direction.opposite_of(direction=mirrored_directions[1],
+                                                          relative_to=direction)] is node:
+                mirrored_direction = mirrored_directions[1]
+
+            if neighbor.data is not None and \
+                    neighbor.frame.find_location_in_frame(point=neighbor.data.position) == mirrored_direction:
+                dummy_node = neighbor.add_child(direction=mirrored_direction, is_dummy=True)
+                dummy_node.data = neighbor.data
+                return dummy_node
+
+            neighbor = neighbor.children[mirrored_direction]
+
+        return neighbor
 
     def find_neighbors_of_smaller_size(self, neighbor, direction: str) -> list:
-        candidates = [] if neighbor is None else [neighbor]
+        candidates = deque() if neighbor is None else deque([neighbor])
         neighbors = []
         counter_direction = Direction.opposite_of(direction=direction)  # CHANGES IN CASE OF DIAGONAL, TO SPLIT_DIRECTION
 
-        while len(candidates) > 0:
-            if candidates[0] is not None:
-
-                if candidates[0].is_leaf():
-                    neighbors.append(candidates[0])
+        while candidates:
+            candidate = candidates.popleft()
+            if candidate is None:
+                continue
 
-                elif candidates[0].data is not None:
-                    data_direction = candidates[0].frame.find_location_in_frame(point=candidates[0].data.position)
-                    if data_direction in Direction.neighboring[direction]:  # CHANGES IN CASE OF DIAGONAL
-                        neighbors.append(candidates[0])
+            if candidate.is_leaf():
+                neighbors.append(candidate)
 
-                if ((not candidates[0].has_children_in_direction(direction=counter_direction))
-                        and not candidates[0].has_data_in_direction(direction=counter_direction)):
-                    candidates.append(candidates[0].children[Direction.neighboring[counter_direction][0]])
-                    candidates.append(candidates[0].children[Direction.neighboring[counter_direction][1]])
-                else:
-                    candidates.append(candidates[0].children[Direction.neighboring[direction][0]])
-                    candidates.append(candidates[0].children[Direction.neighboring[direction][1]])
+            elif candidate.data is not None:
+                data_direction = candidate.frame.find_location_in_frame(point=candidate.data.position)
+                if data_direction in Direction.neighboring[direction]:  # CHANGES IN CASE OF DIAGONAL
+                    neighbors.append(candidate)
 
-            candidates.remove(candidates[0])
+            if ((not candidate.has_children_in_direction(direction=counter_direction))
+                    and not candidate.has_data_in_direction(direction=counter_direction)):
+                candidates.append(candidate.children[Direction.neighboring[counter_direction][0]])
+                candidates.append(candidate.children[Direction.neighboring[counter_direction][1]])
+            else:
+                candidates.append(candidate.children[Direction.neighboring[direction][0]])
+                candidates.append(candidate.children[Direction.neighboring[direction][1]])
 
         return neighbors
 
@@ -598,7 +678,9 @@ class Node:
         return diagonal_neighbors
 
     def find_diagonal_descendants(self, direction: int) -> list:
-        corner_point = deepcopy(self.frame.get_corners()[direction])
+        # The frame's own corner Points must not be nudged
+        corner = self.frame.get_corners()[direction]
+        corner_point = Point(x=corner.x, y=corner.y)
         corner_point.nudge(direction=Direction.opposite_of(direction=direction, relative_to="center"))
 
         corner_node = self.find_containing_node(point=corner_point)
@@ -606,7 +688,6 @@ class Node:
         if corner_node.is_leaf() or corner_node.has_data_in_direction(direction=direction):
             return [corner_node]
 
-        dummy_node = corner_node.add_child(direction=direction, is_dummy=True)
         split_direction = Direction.split_direction(direction=direction)
 
         corner_nodes = []
@@ -614,7 +695,7 @@ class Node:
         for s_direction in split_direction:
             counter_direction = Direction.opposite_of(direction=direction, relative_to=s_direction)
             if corner_node.children[counter_direction] is not None:
-                corner_nodes.extend(dummy_node.find_neighbors_of_smaller_size(
+                corner_nodes.extend(corner_node.find_neighbors_of_smaller_size(
                     neighbor=corner_node.children[counter_direction], direction=s_direction))
 
         return corner_nodes
@@ -652,56 +733,401 @@ class Node:
     def draw(self, ax):
         """Draw a representation of the quadtree on Matplotlib Axes ax."""
 
-        self.frame.draw(ax=ax)
-        if self.is_divided:
-            for child in self.children:
-                if child is not None:
-                    child.draw(ax=ax)
+        # Preorder, like the children's order
+        nodes_stack = [self]
+        while nodes_stack:
+            node = nodes_stack.pop()
+            node.frame.draw(ax=ax)
+            if node.is_divided:
+                nodes_stack.extend(child for child in reversed(node.children) if child is not None)
+
+
+def get_data_id(data) -> Any:
+    """
+    The get_data_id function returns the id of a NodeData's data: the Spotify ID of a Song, and the data itself
+    otherwise (e.g. the ids or rows of from_arrays).
+    """
+    return data.get_id() if isinstance(data, Song) else data
+
+
+class QueryContext:
+    """
+    A QueryContext holds the state of a single nearest-neighbors query: the query point, the priority queue of the
+    closest NodeData found so far and, optionally, the nodes whose data was examined.
+    Queries keep all their state in their own context and only read the tree, so many threads can query a shared
+    Quadtree at once (as long as nothing is inserted meanwhile).
+    """
+
+    def __init__(self, point: Point, k: int = 1, keep_candidates: bool = False):
+        self.point = point
+        self.k = k
+        self.nearest = []  # Max-heap of the k closest: (-distance, tie breaker, NodeData)
+        self.candidates = [] if keep_candidates else None
+        self.tie_breaker = count()  # Nodes and NodeData are not comparable
+
+    def __repr__(self):
+        return f"<Query: {self.point} | k: {self.k}, Found: {len(self.nearest)}>"
+
+    def is_full(self) -> bool:
+        return len(self.nearest) == self.k
+
+    def max_distance(self) -> float:
+        """
+        The max_distance method returns the distance of the k-th closest NodeData found so far, or infinity before k
+        NodeData were found. Anything farther than it can't be in the result.
+        """
+        return -self.nearest[0][0] if self.is_full() else float("inf")
+
+    def examine(self, node) -> None:
+        """
+        The examine method measures the distance to every NodeData in the node's bucket and keeps the ones that are
+        among the k closest so far.
+        :param node: A Node with data.
+        :return: None.
+        """
+        if self.candidates is not None:
+            self.candidates.append(node)
+
+        for node_data in node.bucket:
+            data_item = (-self.point.distance_to(other=node_data.position), next(self.tie_breaker), node_data)
+            if not self.is_full():
+                heapq.heappush(self.nearest, data_item)
+            elif data_item[0] > self.nearest[0][0]:
+                heapq.heapreplace(self.nearest, data_item)
+
+    def results(self) -> list:
+        return [data_item[2] for data_item in sorted(self.nearest, key=lambda item: (-item[0], item[1]))]
 
 
 class Quadtree:
 
-    def __init__(self):
+    def __init__(self, capacity: int = DEFAULT_BUCKET_CAPACITY, min_cell_size: float = DEFAULT_MIN_CELL_SIZE):
+        """
+        :param capacity: Number of NodeData a leaf holds before it is split. Larger buckets make shallower trees with
+        fewer nodes, but every visited leaf costs more distance computations.
+        :param min_cell_size: Leaves whose frame is at most this wide are never split and hold any number of NodeData.
+        :raises ValueError: If capacity is smaller than 1, or min_cell_size isn't positive.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        if not min_cell_size > 0:
+            raise ValueError(f"min_cell_size must be greater than 0, got {min_cell_size}")
+
         self.root = Node(frame=Frame(top_left=Point(x=0.0, y=1.0),
                                      bottom_right=Point(x=1.0, y=0.0)))
 
+        self.capacity = int(capacity)
+        root_width = self.root.frame.bottom_right.x - self.root.frame.top_left.x
+        self.max_depth = min(max(ceil(log2(root_width / min_cell_size)), 0), MORTON_BITS)
+
         self.total_leaves = 0
         self.depth = 0
 
+        # A StaticQuadtree copy of the data for batch queries, built on demand and dropped when the data changes
+        self.snapshot = None
+
+        # The NodeData of every id (see get_data_id), each linked to the Node that holds it
+        self.nodedata_by_id = {}
+
     def __repr__(self):
         return f"Data count: {self.total_leaves}"
 
+    @classmethod
+    def from_arrays(cls, energy: np.ndarray, valence: np.ndarray, ids: np.ndarray = None, data: Sequence = None,
+                    capacity: int = DEFAULT_BUCKET_CAPACITY, min_cell_size: float = DEFAULT_MIN_CELL_SIZE):
+        """
+        The from_arrays method builds a Quadtree from columns of mood values in a single pass.
+        The points are sorted by their Morton codes and the tree is built top-down (see Node.build), which is much
+        faster than inserting the points one by one. Points outside the tree's frame are skipped like in insert.
+        :param energy: Energy values (x).
+        :param valence: Valence values (y), aligned with energy.
+        :param ids: Optional ids of the points, used as the NodeData's data.
+        :param data: Optional items of the points (e.g. Songs), used as the NodeData's data instead of the ids.
+        :param capacity: See __init__.
+        :param min_cell_size: See __init__.
+        :return: A new Quadtree. Without ids and data, the NodeData's data is the point's row in the arrays.
+        """
+        quadtree = cls(capacity=capacity, min_cell_size=min_cell_size)
+        frame = quadtree.root.frame
+
+        energy = np.asarray(energy, dtype=np.float64)
+        valence = np.asarray(valence, dtype=np.float64)
+        assert energy.shape == valence.shape and energy.ndim == 1
+
+        in_frame = ((frame.top_left.x <= energy) & (energy < frame.bottom_right.x) &
+                    (frame.bottom_right.y <= valence) & (valence < frame.top_left.y))
+        rows = np.flatnonzero(in_frame)
+
+        codes = morton_codes(x=energy[rows], y=valence[rows])
+        order = np.argsort(codes, kind="stable")
+        rows, codes = rows[order], codes[order]
+
+        if len(rows) < len(energy):
+            print(f"Skipped {len(energy) - len(rows)} points: not in frame!")
+
+        if data is not None:
+            items = [data[row] for row in rows.tolist()]
+        elif ids is not None:
+            items = np.asarray(ids)[rows].tolist()
+        else:
+            items = rows.tolist()
+
+        node_datas = [NodeData(position=Point(x=x, y=y), data=item)
+                      for x, y, item in zip(energy[rows].tolist(), valence[rows].tolist(), items)]
+
+        quadtree.root.build(node_datas=node_datas, codes=codes.tolist(), capacity=quadtree.capacity,
+                            max_depth=quadtree.max_depth)
+        quadtree.total_leaves = len(node_datas)
+        for node_data in node_datas:
+            quadtree.register(node_data=node_data)
+
+        return quadtree
+
+    @classmethod
+    def from_songs(cls, songs: Sequence[Song], capacity: int = DEFAULT_BUCKET_CAPACITY,
+                   min_cell_size: float = DEFAULT_MIN_CELL_SIZE):
+        energy = np.fromiter((song.mood_vec.energy for song in songs), dtype=np.float64, count=len(songs))
+        valence = np.fromiter((song.mood_vec.valence for song in songs), dtype=np.float64, count=len(songs))
+        return cls.from_arrays(energy=energy, valence=valence, data=songs, capacity=capacity,
+                               min_cell_size=min_cell_size)
+
+    @classmethod
+    def from_dataframe(cls, df, id_column: str = None, capacity: int = DEFAULT_BUCKET_CAPACITY,
+                       min_cell_size: float = DEFAULT_MIN_CELL_SIZE):
+        """
+        The from_dataframe method builds a Quadtree from a DataFrame with energy and valence columns (see from_arrays).
+        :param df: The songs' DataFrame.
+        :param id_column: Optional column with the songs' ids, used as the NodeData's data.
+        :param capacity: See __init__.
+        :param min_cell_size: See __init__.
+        :return: A new Quadtree. Without an id column, a DataFrame with title and artist columns is built into Songs
+        (with their spotify_ID and href when there are such columns), and any other DataFrame into its index labels.
+        """
+        energy, valence = df["energy"].to_numpy(), df["valence"].to_numpy()
+
+        if id_column is not None:
+            return cls.from_arrays(energy=energy, valence=valence, ids=df[id_column].to_numpy(), capacity=capacity,
+                                   min_cell_size=min_cell_size)
+
+        if "title" not in df.columns or "artist" not in df.columns:
+            return cls.from_arrays(energy=energy, valence=valence, ids=df.index.to_numpy(), capacity=capacity,
+                                   min_cell_size=min_cell_size)
+
+        missing = [None] * len(df)
+        songs = [Song(title=title, artist=artist, spotify_ID=spotify_id, href=href,
+                      mood_vec=MoodVec(energy=song_energy, valence=song_valence))
+                 for title, artist, spotify_id, href, song_energy, song_valence in zip(
+                    df["title"].tolist(), df["artist"].tolist(),
+                    df["spotify_ID"].tolist() if "spotify_ID" in df.columns else missing,
+                    df["href"].tolist() if "href" in df.columns else missing,
+                    energy.tolist(), valence.tolist())]
+
+        return cls.from_arrays(energy=energy, valence=valence, data=songs, capacity=capacity,
+                               min_cell_size=min_cell_size)
+
+    def register(self, node_data: NodeData):
+        data_id = get_data_id(data=node_data.data)
+        if data_id is not None:
+            self.nodedata_by_id[data_id] = node_data
+
     def insert_data(self, data: Song = None):
         node_data = NodeData(position=Point(x=data.mood_vec.energy, y=data.mood_vec.valence), data=data)
-        self.root.insert(node_data=node_data)
+        self.insert_nodedata(node_data=node_data)
+
+    def insert_nodedata(self, node_data: NodeData):
+        self.root.insert(node_data=node_data, capacity=self.capacity, max_depth=self.max_depth)
+        if node_data.node is None:  # Not in frame
+            return
+
         self.total_leaves += 1
+        self.register(node_data=node_data)
+        self.snapshot = None
+
+    def remove(self, song_id) -> NodeData:
+        """
+        The remove method removes the data of a given id from the tree (see get_data_id).
+        The NodeData is found through the id map, and only the nodes above it are fixed (see Node.collapse).
+        :param song_id: The id of the data, e.g. a Spotify ID.
+        :return: The removed NodeData.
+        """
+        node_data = self.nodedata_by_id.pop(song_id)
+        node = node_data.node
+
+        node.remove_data(node_data=node_data)
+        node.collapse(capacity=self.capacity)
+
+        self.total_leaves -= 1
+        self.snapshot = None
+        return node_data
+
+    def update(self, song_id, new_mood_vec: MoodVec) -> NodeData:
+        """
+        The update method moves the data of a given id to a new mood vector. Songs get the new mood vector too.
+        A leaf's data that stays inside the leaf's frame is moved in place, otherwise it is removed and inserted again.
+        :param song_id: The id of the data, e.g. a Spotify ID.
+        :param new_mood_vec: The new MoodVec of the data.
+        :return: The moved NodeData.
+        :raises ValueError: If the new mood vector is not in the tree's frame. The data is then left where it was.
+        """
+        node_data = self.nodedata_by_id[song_id]
+        new_position = Point(x=new_mood_vec.energy, y=new_mood_vec.valence)
+
+        if not self.root.frame.contains(point=new_position):
+            raise ValueError(f"Can't move {song_id} to {new_position}: not in frame!")
+
+        if node_data.node.is_leaf() and node_data.node.frame.contains(point=new_position):
+            node_data.position = new_position
+            self.snapshot = None
+        else:
+            self.remove(song_id=song_id)
+            node_data.position = new_position
+            self.insert_nodedata(node_data=node_data)
+
+        if isinstance(node_data.data, Song):
+            node_data.data.mood_vec = new_mood_vec
+        return node_data
 
     def find_containing_node(self, point: Point) -> Node:
-        containing_node = self.root.find_containing_node(point=point)
-        containing_node.external_point = point
-        return containing_node
+        return self.root.find_containing_node(point=point)
 
     def find_nearest_song(self, point: Point) -> Any:
-        point_node = self.find_containing_node(point=point)
+        nearest = self.find_k_nearest(point=point, k=1)
+        return nearest[0].data if nearest else None
 
-        pass
+    def search(self, context: QueryContext) -> QueryContext:
+        """
+        The search method finds the k closest NodeData to the context's point with a best-first traversal.
+        Nodes are visited by the distance of their Frame from the point, and the traversal stops once the closest
+        unvisited Frame is farther than the k-th closest NodeData found, so the cost grows with k and not with
+        the amount of data in the tree. The tree is only read, all the query's state is kept in the context.
+        :param context: The query's QueryContext.
+        :return: The same context, holding the results.
+        """
+        if context.k <= 0:
+            return context
 
-    def find_nearest_nodedata(self, point: Point, with_candidates: bool = False) -> NodeData:
-        candidate_nodes = self.get_candidate_nodes(point=point)
+        point, tie_breaker = context.point, context.tie_breaker
+        nodes_heap = [(0.0, next(tie_breaker), self.root)]
+
+        while nodes_heap:
+            frame_distance, _, node = heapq.heappop(nodes_heap)
+            if frame_distance > context.max_distance():
+                break
+
+            if node.bucket:
+                context.examine(node=node)
+
+            for child in node.children:
+                if child is not None:
+                    child_distance = child.frame.distance_to(point=point)
+                    if child_distance <= context.max_distance():
+                        heapq.heappush(nodes_heap, (child_distance, next(tie_breaker), child))
+
+        return context
+
+    def find_k_nearest(self, point: Point, k: int) -> list[NodeData]:
+        """
+        The find_k_nearest method finds the k closest NodeData to a given point (see search).
+        :param point: A Point object.
+        :param k: Number of NodeData to find.
+        :return: Up to k NodeData, closest first.
+        """
+        return self.search(context=QueryContext(point=point, k=k)).results()
+
+    def find_within_radius(self, point: Point, r: float) -> list[NodeData]:
+        """
+        The find_within_radius method finds all the NodeData at distance of at most r from a given point.
+        Subtrees whose Frame is farther than r from the point are not visited.
+        :param point: A Point object.
+        :param r: The radius.
+        :return: The NodeData within the radius, closest first.
+        """
+        found = []
+        nodes = [self.root]
+
+        while nodes:
+            node = nodes.pop()
+
+            for node_data in node.bucket:
+                data_distance = point.distance_to(other=node_data.position)
+                if data_distance <= r:
+                    found.append((data_distance, len(found), node_data))
 
-        # print(f"Number of candidates: {len(candidate_nodes)}")
-        # print(*candidate_nodes, sep="\n")
+            for child in node.children:
+                if child is not None and child.frame.distance_to(point=point) <= r:
+                    nodes.append(child)
 
-        min_distance = (None, 1)
-        for node in candidate_nodes:
-            curr_distance = point.distance_to(other=node.data.position)
-            min_distance = (node, curr_distance) if curr_distance < min_distance[1] else min_distance
+        return [data_item[2] for data_item in sorted(found)]
 
-        return min_distance[0].data if not with_candidates else (min_distance[0].data, candidate_nodes)
+    def get_nodedatas(self) -> list[NodeData]:
+        nodedatas = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            nodedatas.extend(node.bucket)
+            nodes.extend(child for child in node.children if child is not None)
+
+        return nodedatas
+
+    def get_snapshot(self):
+        """
+        The get_snapshot method returns an array-backed StaticQuadtree of the tree's NodeData, whose data is an object
+        array of the NodeData. It is built on the first call and kept until the tree's data changes.
+        :return: A StaticQuadtree object.
+        """
+        if self.snapshot is None:
+            # StaticQuadtree imports this module
+            from sources.db.quadtree.StaticQuadtree import StaticQuadtree
+
+            nodedatas = self.get_nodedatas()
+            energy = np.fromiter((nodedata.position.x for nodedata in nodedatas), dtype=np.float32, count=len(nodedatas))
+            valence = np.fromiter((nodedata.position.y for nodedata in nodedatas), dtype=np.float32,
+                                  count=len(nodedatas))
+            nodedatas_array = np.empty(len(nodedatas), dtype=object)
+            nodedatas_array[:] = nodedatas
+            self.snapshot = StaticQuadtree(energy=energy, valence=valence, data=nodedatas_array)
+
+        return self.snapshot
+
+    def query_batch(self, points: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query_batch method finds the k closest NodeData to each of many points at once, with vectorized distance
+        computations over groups of nearby points (see StaticQuadtree.query_batch).
+        The search runs on the tree's snapshot (see get_snapshot), whose positions are float32.
+        :param points: (N, 2) array of (energy, valence) points.
+        :param k: Number of NodeData to find for every point.
+        :return: A tuple of (N, k) arrays - the closest NodeData, as an object array (0), and their distances (1),
+        closest first. The NodeData stay valid when the tree changes, unlike positions in the snapshot. Missing NodeData
+        (when the tree has fewer than k) are None.
+        """
+        snapshot = self.get_snapshot()
+        rows, distances = snapshot.query_batch(points=points, k=k)
+
+        nodedatas = np.full(rows.shape, None, dtype=object)
+        found = rows >= 0
+        nodedatas[found] = snapshot.data[rows[found]]
+        return nodedatas, distances
+
+    def find_nearest_nodedata(self, point: Point, with_candidates: bool = False) -> NodeData:
+        """
+        The find_nearest_nodedata method finds the closest NodeData to a given point (see search).
+        :param point: A Point object.
+        :param with_candidates: Also return the nodes whose data was examined.
+        :return: The closest NodeData (None if the tree is empty), and the examined nodes if with_candidates is set.
+        """
+        context = self.search(context=QueryContext(point=point, k=1, keep_candidates=with_candidates))
+        nearest = context.results()
+        nearest_data = nearest[0] if nearest else None
+
+        return nearest_data if not with_candidates else (nearest_data, context.candidates)
 
     def get_candidate_nodes(self, point: Point):
+        """
+        The get_candidate_nodes method finds the nodes around a given point using neighbor finding.
+        It is kept for drawing the tree's neighbors and is not used by the searches, as it allocates dummy nodes.
+        """
         containing_node = self.find_containing_node(point=point)
-        return containing_node.find_candidates()
+        return containing_node.find_candidates(point=point)
 
     def draw(self, ax):
         self.root.draw(ax=ax)
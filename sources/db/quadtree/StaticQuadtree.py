@@ -0,0 +1,512 @@
+import heapq
+from typing import Any, Sequence
+import numpy as np
+from sources.db.quadtree.Quadtree import Point, NodeData
+from sources.db.quadtree.Morton import MORTON_BITS, morton_codes
+from items.Song import Song
+from configs.Array_Store import write_arrays, read_arrays, StringColumn
+from sources.db.Song_Table import SongTable
+
+
+################
+# An array-backed, bulk-built point quadtree over the (energy, valence) mood space.
+#
+# The points are sorted by their Morton (Z-order) code, so every node of the tree covers a contiguous range of
+# the sorted points. The tree itself is a handful of flat arrays - there are no per-node or per-point objects:
+#   - points:      (N, 2) float32 - the points, in Morton order
+#   - point_rows:  (N,)   int64   - the input row of every sorted point
+#   - node_range:  (M, 2) int64   - the [start, end) range of sorted points under every node
+#   - node_bounds: (M, 4) float32 - tight bounding box of every node (min_x, min_y, max_x, max_y)
+#   - node_child:  (M, 2) int64   - offset of the first child and the number of children (0 for leaves)
+#
+# Nodes are stored in breadth-first order, so the children of a node are contiguous.
+#
+# A tree is saved as a snapshot file of these arrays and its id table (see Array_Store.py). Loading a snapshot
+# memory-maps it, so it takes no time regardless of the tree's size, and forked workers share the tree's pages.
+################
+
+DEFAULT_LEAF_SIZE = 16
+MAX_BATCH_GROUP = 256  # Maximal number of queries whose distances are computed at once in query_batch
+MAX_GROUP_POINTS = 2 ** 12  # Maximal number of points in the tree node of a group of queries in query_batch
+BATCH_GROUP_COST = 20000  # Python work of a group of queries in query_batch, in distance computations
+LOOP_POINTS_PER_QUERY = 200  # query_batch searches the queries one by one when there are more points per query
+SNAPSHOT_FORMAT = "static_quadtree"
+TREE_ARRAYS = ("points", "point_rows", "node_range", "node_child", "node_bounds")
+
+
+def squared_distances(queries: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    The squared_distances function computes the squared distances between every query and every point.
+
+    :param queries:np.ndarray: (Q, 2) array of query points
+    :param points:np.ndarray: (P, 2) array of points
+    :return: (Q, P) array of the squared distances
+    """
+    return (queries[:, 0:1] - points[:, 0]) ** 2 + (queries[:, 1:2] - points[:, 1]) ** 2
+
+
+class StaticQuadtree:
+    """
+    A StaticQuadtree is a compact, read-only quadtree over mood vectors, built in bulk from arrays.
+    Queries return rows of the input arrays; NodeData queries return the matching item of data when it is given.
+    """
+
+    def __init__(self, energy: np.ndarray, valence: np.ndarray,
+                 ids: np.ndarray = None,
+                 data: Sequence = None,
+                 leaf_size: int = DEFAULT_LEAF_SIZE):
+
+        energy = np.asarray(energy, dtype=np.float32)
+        valence = np.asarray(valence, dtype=np.float32)
+        assert energy.shape == valence.shape and energy.ndim == 1
+
+        self.ids = None if ids is None else np.asarray(ids)
+        self.data = data
+        self.leaf_size = max(int(leaf_size), 1)
+
+        codes = morton_codes(x=energy, y=valence)
+        self.point_rows = np.argsort(codes, kind="stable")
+        codes = codes[self.point_rows]
+        self.points = np.column_stack((energy[self.point_rows], valence[self.point_rows]))
+
+        self._build_nodes(codes=codes)
+        self._batch_index = None
+
+    def __repr__(self):
+        return f"<StaticQuadtree | Points: {len(self)}, Nodes: {len(self.node_range)}>"
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def from_songs(cls, songs: Sequence[Song], leaf_size: int = DEFAULT_LEAF_SIZE):
+        energy = np.fromiter((song.mood_vec.energy for song in songs), dtype=np.float32, count=len(songs))
+        valence = np.fromiter((song.mood_vec.valence for song in songs), dtype=np.float32, count=len(songs))
+        return cls(energy=energy, valence=valence, data=songs, leaf_size=leaf_size)
+
+    @classmethod
+    def from_song_table(cls, song_table: SongTable, leaf_size: int = DEFAULT_LEAF_SIZE):
+        return cls(energy=song_table.energy, valence=song_table.valence, data=song_table, leaf_size=leaf_size)
+
+    @classmethod
+    def from_dataframe(cls, df, id_column: str = None, leaf_size: int = DEFAULT_LEAF_SIZE):
+        """
+        The from_dataframe function builds the tree from a DataFrame with energy and valence columns.
+
+        :param df:pd.DataFrame: The songs' DataFrame
+        :param id_column:str: Optional column with the songs' ids
+        :param leaf_size:int: Maximal number of points in a leaf
+        :return: StaticQuadtree object
+        """
+        return cls(energy=df["energy"].to_numpy(), valence=df["valence"].to_numpy(),
+                   ids=None if id_column is None else df[id_column].to_numpy(),
+                   leaf_size=leaf_size)
+
+    ####################
+    # SNAPSHOT METHODS #
+    ####################
+
+    def get_ids(self) -> Sequence | None:
+        """
+        The get_ids function returns the ids of the tree's input rows: its ids if it has ids, and the Spotify ids of its
+        songs if its data is a SongTable or a list of Songs.
+        """
+        if self.ids is not None:
+            return self.ids
+        if isinstance(self.data, SongTable):
+            return self.data.texts["spotify_ID"]
+        if self.data is not None and all(isinstance(item, Song) for item in self.data):
+            return [item.spotify_ID or "" for item in self.data]
+        return None
+
+    def save(self, path: str) -> None:
+        """
+        The save function writes a snapshot of the tree: its arrays and its id table (see get_ids).
+        The data of the tree is not saved, songs' metadata is saved separately in a SongTable (see SongTable.save).
+
+        :param path:str: Path of the snapshot file
+        :return: None
+        """
+        arrays = {name: getattr(self, name) for name in TREE_ARRAYS}
+
+        ids, ids_kind = self.get_ids(), None
+        if isinstance(ids, StringColumn):
+            arrays.update(ids.to_arrays(name="ids"))
+            ids_kind = "strings"
+        elif ids is not None:
+            ids = np.asarray(ids)
+            if ids.dtype.kind in "USO":
+                arrays.update(StringColumn.from_strings(strings=[str(item) for item in ids.tolist()]).to_arrays(name="ids"))
+                ids_kind = "strings"
+            else:
+                arrays["ids"] = ids
+                ids_kind = "array"
+
+        write_arrays(path=path, arrays=arrays,
+                     meta={"format": SNAPSHOT_FORMAT, "leaf_size": self.leaf_size, "points": len(self), "ids": ids_kind})
+
+    @classmethod
+    def load(cls, path: str, data: Sequence = None):
+        """
+        The load function memory-maps a snapshot written by save. Nothing is rebuilt, the tree's arrays are read-only
+        views of the file.
+
+        :param path:str: Path of the snapshot file
+        :param data:Sequence: Optional data of the tree's input rows, e.g. a loaded SongTable
+        :return: StaticQuadtree object
+        """
+        arrays, meta = read_arrays(path=path)
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a quadtree snapshot file")
+
+        quadtree = cls.__new__(cls)
+        for name in TREE_ARRAYS:
+            setattr(quadtree, name, arrays[name])
+
+        quadtree.leaf_size = meta["leaf_size"]
+        quadtree.data = data
+        quadtree._batch_index = None
+        match meta["ids"]:
+            case "strings":
+                quadtree.ids = StringColumn.from_arrays(arrays=arrays, name="ids")
+            case "array":
+                quadtree.ids = arrays["ids"]
+            case _:
+                quadtree.ids = None
+
+        return quadtree
+
+    #################
+    # BUILD METHODS #
+    #################
+
+    def _build_nodes(self, codes: np.ndarray) -> None:
+        """
+        The _build_nodes function splits the Morton-sorted points top-down, breadth first.
+        A node is split on the first quadtree level at which its points differ, so chains of single-child nodes
+        are never created. Nodes with at most leaf_size points, or whose points all share a code, become leaves.
+
+        :param codes:np.ndarray: The sorted Morton codes of the points
+        :return: None
+        """
+        node_range = [(0, len(codes))] if len(codes) > 0 else []
+        node_child = []
+        node_depth = [0] * len(node_range)
+        node_parent = [-1] * len(node_range)
+
+        node = 0
+        while node < len(node_range):
+            start, end = node_range[node]
+            first_code, last_code = int(codes[start]), int(codes[end - 1])
+
+            if end - start <= self.leaf_size or first_code == last_code:
+                node_child.append((0, 0))
+                node += 1
+                continue
+
+            # The first level at which the node's first and last points (and so all of them) are in different cells
+            level = (63 - (first_code ^ last_code).bit_length() + 1) // 2
+            shift = 2 * (MORTON_BITS - 1 - level)
+            prefix = (first_code >> (shift + 2)) << (shift + 2)
+            thresholds = np.array([prefix + (quadrant << shift) for quadrant in (1, 2, 3)], dtype=np.uint64)
+            borders = [start, *(np.searchsorted(codes[start:end], thresholds) + start).tolist(), end]
+
+            first_child = len(node_range)
+            for child_start, child_end in zip(borders[:-1], borders[1:]):
+                if child_end > child_start:
+                    node_range.append((child_start, child_end))
+                    node_depth.append(node_depth[node] + 1)
+                    node_parent.append(node)
+
+            node_child.append((first_child, len(node_range) - first_child))
+            node += 1
+
+        self.node_range = np.array(node_range, dtype=np.int64).reshape(-1, 2)
+        self.node_child = np.array(node_child, dtype=np.int64).reshape(-1, 2)
+        self.node_bounds = self._build_bounds(node_depth=np.array(node_depth, dtype=np.int64),
+                                              node_parent=np.array(node_parent, dtype=np.int64))
+
+    def _build_bounds(self, node_depth: np.ndarray, node_parent: np.ndarray) -> np.ndarray:
+        node_bounds = np.empty((len(self.node_range), 4), dtype=np.float32)
+        if len(node_bounds) == 0:
+            return node_bounds
+
+        # Leaves partition the sorted points, so their bounds are a single segmented reduction
+        leaves = np.flatnonzero(self.node_child[:, 1] == 0)
+        leaves = leaves[np.argsort(self.node_range[leaves, 0])]
+        leaf_starts = self.node_range[leaves, 0]
+        node_bounds[leaves, 0:2] = np.minimum.reduceat(self.points, leaf_starts, axis=0)
+        node_bounds[leaves, 2:4] = np.maximum.reduceat(self.points, leaf_starts, axis=0)
+
+        # Inner nodes bounds are their children's, deepest level first
+        inner = self.node_child[:, 1] > 0
+        node_bounds[inner, 0:2] = np.inf
+        node_bounds[inner, 2:4] = -np.inf
+        for depth in range(int(node_depth.max()), 0, -1):
+            nodes = np.flatnonzero(node_depth == depth)
+            parents = node_parent[nodes]
+            np.minimum.at(node_bounds[:, 0], parents, node_bounds[nodes, 0])
+            np.minimum.at(node_bounds[:, 1], parents, node_bounds[nodes, 1])
+            np.maximum.at(node_bounds[:, 2], parents, node_bounds[nodes, 2])
+            np.maximum.at(node_bounds[:, 3], parents, node_bounds[nodes, 3])
+
+        return node_bounds
+
+    #################
+    # QUERY METHODS #
+    #################
+
+    def _search(self, x: float, y: float, k: int) -> list[tuple[float, int]]:
+        """
+        The _search function finds the k nearest points to (x, y) with a best-first traversal: nodes are visited in
+        the order of their bounding box's distance from the point, and the search stops once the nearest unvisited
+        node is farther than the k-th nearest point found.
+
+        :return: A list of (squared distance, sorted point position) tuples, nearest first
+        """
+        if len(self.points) == 0 or k <= 0:
+            return []
+
+        points, node_range, node_child, node_bounds = self.points, self.node_range, self.node_child, self.node_bounds
+
+        nodes_heap = [(0.0, 0)]
+        best = []  # Max-heap of the k nearest points: (-squared distance, position)
+
+        while nodes_heap:
+            node_distance, node = heapq.heappop(nodes_heap)
+            if len(best) == k and node_distance > -best[0][0]:
+                break
+
+            first_child, children_count = node_child[node].tolist()
+
+            if children_count == 0:
+                start, end = node_range[node].tolist()
+                for position, (point_x, point_y) in enumerate(points[start:end].tolist(), start=start):
+                    item = (-((point_x - x) ** 2 + (point_y - y) ** 2), position)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+
+            for child, (min_x, min_y, max_x, max_y) in enumerate(
+                    node_bounds[first_child:first_child + children_count].tolist(), start=first_child):
+                dx = min_x - x if x < min_x else (x - max_x if x > max_x else 0.0)
+                dy = min_y - y if y < min_y else (y - max_y if y > max_y else 0.0)
+                child_distance = dx * dx + dy * dy
+                if len(best) < k or child_distance <= -best[0][0]:
+                    heapq.heappush(nodes_heap, (child_distance, child))
+
+        return sorted((-distance, position) for distance, position in best)
+
+    def query(self, x: float, y: float, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query function finds the k nearest points to (x, y).
+
+        :param x:float: Energy value of the query
+        :param y:float: Valence value of the query
+        :param k:int: Number of neighbors
+        :return: A tuple of the input rows of the neighbors (0) and their distances (1), nearest first
+        """
+        found = self._search(x=float(x), y=float(y), k=k)
+        positions = np.array([position for _, position in found], dtype=np.int64)
+        distances = np.sqrt(np.array([distance for distance, _ in found], dtype=np.float64))
+        return self.point_rows[positions], distances
+
+    def _get_batch_index(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The _get_batch_index function returns the Morton codes of the sorted points, the leaves in the order of their
+        points and the parent of every node. They are only needed by query_batch, so they are computed on its first call.
+        """
+        if self._batch_index is None:
+            # Nodes are in breadth-first order, so the children of the inner nodes, in order, are nodes 1 to M - 1
+            inner = np.flatnonzero(self.node_child[:, 1] > 0)
+            node_parent = np.full(len(self.node_range), -1, dtype=np.int64)
+            node_parent[1:] = np.repeat(inner, self.node_child[inner, 1])
+
+            leaves = np.flatnonzero(self.node_child[:, 1] == 0)
+            leaves = leaves[np.argsort(self.node_range[leaves, 0])]
+
+            self._batch_index = (morton_codes(x=self.points[:, 0], y=self.points[:, 1]), leaves, node_parent)
+
+        return self._batch_index
+
+    def _get_point_groups(self, group_points: int) -> np.ndarray:
+        """
+        The _get_point_groups function returns the group of every sorted point in query_batch: the highest node above
+        its leaf with at most group_points points. Groups follow the density of the points, so their areas are small
+        where the points are dense.
+
+        :param group_points:int: Maximal number of points in a group's node (unless it is a leaf)
+        :return: The group node of every sorted point
+        """
+        _, leaves, node_parent = self._get_batch_index()
+        node_count = self.node_range[:, 1] - self.node_range[:, 0]
+
+        groups = leaves.copy()
+        while True:
+            parents = node_parent[groups]
+            can_merge = parents >= 0
+            can_merge[can_merge] = node_count[parents[can_merge]] <= group_points
+            if not can_merge.any():
+                break
+            groups[can_merge] = parents[can_merge]
+
+        return np.repeat(groups, node_count[leaves])
+
+    def _find_leaves_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[tuple[int, int]]:
+        """
+        The _find_leaves_in_box function finds the leaves whose bounding box intersects the given box.
+
+        :return: A list of the [start, end) ranges of the leaves' sorted points
+        """
+        node_range, node_child, node_bounds = self.node_range, self.node_child, self.node_bounds
+
+        ranges = []
+        nodes_stack = [0]
+        while nodes_stack:
+            node = nodes_stack.pop()
+            first_child, children_count = node_child[node].tolist()
+
+            if children_count == 0:
+                ranges.append(tuple(node_range[node].tolist()))
+                continue
+
+            for child, (child_min_x, child_min_y, child_max_x, child_max_y) in enumerate(
+                    node_bounds[first_child:first_child + children_count].tolist(), start=first_child):
+                if child_min_x <= max_x and min_x <= child_max_x and child_min_y <= max_y and min_y <= child_max_y:
+                    nodes_stack.append(child)
+
+        return ranges
+
+    def query_batch(self, points: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The query_batch function finds the k nearest points to each of many query points.
+        The queries are sorted by their Morton codes and grouped by the tree node they fall into. The distances from the
+        queries to their Morton-order neighbors bound the distance of their k-th nearest points, so every group only
+        needs the points of the leaves around it, and the distances of a whole group are computed in one
+        vectorized step. The Python-level work is per group of queries, not per query.
+
+        :param points:np.ndarray: (N, 2) array of (energy, valence) query points
+        :param k:int: Number of neighbors
+        :return: A tuple of (N, k) arrays - the input rows of the neighbors (0) and their distances (1), nearest first.
+        When the tree has fewer than k points, the missing neighbors get row -1 and an infinite distance
+        """
+        queries = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float64)
+
+        k_found = min(k, len(self.points))
+        if len(queries) == 0 or k_found <= 0:
+            return rows, distances
+
+        # Few queries in a large tree are not worth grouping
+        if len(self.points) > LOOP_POINTS_PER_QUERY * len(queries):
+            for query, (x, y) in enumerate(queries.tolist()):
+                found = self._search(x=x, y=y, k=k_found)
+                rows[query, :k_found] = self.point_rows[[position for _, position in found]]
+                distances[query, :k_found] = np.sqrt([distance for distance, _ in found])
+            return rows, distances
+
+        point_codes, _, _ = self._get_batch_index()
+
+        # Larger groups spread the per-group Python work over more queries, smaller ones compute fewer distances
+        group_points = int(np.sqrt(BATCH_GROUP_COST * len(self.points) / len(queries)))
+        point_groups = self._get_point_groups(group_points=min(max(group_points, self.leaf_size), MAX_GROUP_POINTS))
+        tree_points = self.points.astype(np.float64)
+
+        # Position of every query in the Morton order of the points
+        query_codes = morton_codes(x=queries[:, 0], y=queries[:, 1])
+        positions = np.clip(np.searchsorted(point_codes, query_codes), 0, len(tree_points) - 1)
+
+        # Upper bound of the k-th nearest distance: the k-th nearest among the k_found points on each side in Morton order
+        window_size = min(2 * k_found, len(tree_points))
+        window_start = np.clip(positions - k_found, 0, len(tree_points) - window_size)
+        window = window_start[:, None] + np.arange(window_size)
+        window_distances = np.sum((tree_points[window] - queries[:, None, :]) ** 2, axis=2)
+        bounds = np.sqrt(np.partition(window_distances, k_found - 1, axis=1)[:, k_found - 1])
+
+        query_groups = point_groups[positions]
+        order = np.lexsort((query_codes, query_groups))
+        query_groups = query_groups[order]
+        group_starts = np.flatnonzero(np.r_[True, query_groups[1:] != query_groups[:-1]])
+        group_ends = np.r_[group_starts[1:], len(order)]
+
+        for group_start, group_end in zip(group_starts.tolist(), group_ends.tolist()):
+            node_start, node_end = self.node_range[query_groups[group_start]].tolist()
+            node_candidates = np.arange(node_start, node_end)
+
+            for chunk_start in range(group_start, group_end, MAX_BATCH_GROUP):
+                group = order[chunk_start:min(chunk_start + MAX_BATCH_GROUP, group_end)]
+                group_queries = queries[group]
+
+                # The group's own node usually holds the nearest points, and tightens the bound of the others' distance
+                candidate_distances = squared_distances(queries=group_queries, points=tree_points[node_start:node_end])
+                group_bounds = bounds[group]
+                if len(node_candidates) >= k_found:
+                    node_bounds = np.sqrt(np.partition(candidate_distances, k_found - 1, axis=1)[:, k_found - 1])
+                    group_bounds = np.minimum(group_bounds, node_bounds)
+                radius = float(group_bounds.max())
+
+                (min_x, min_y), (max_x, max_y) = group_queries.min(axis=0), group_queries.max(axis=0)
+                ranges = [(start, end) for start, end in self._find_leaves_in_box(min_x=min_x - radius,
+                                                                                  min_y=min_y - radius,
+                                                                                  max_x=max_x + radius,
+                                                                                  max_y=max_y + radius)
+                          if not node_start <= start < node_end]
+
+                candidates = node_candidates
+                if ranges:
+                    other_candidates = np.concatenate([np.arange(start, end) for start, end in ranges])
+                    candidates = np.concatenate((node_candidates, other_candidates))
+                    candidate_distances = np.hstack((candidate_distances, squared_distances(
+                        queries=group_queries, points=tree_points[other_candidates])))
+
+                if k_found == 1:
+                    nearest = np.argmin(candidate_distances, axis=1)[:, None]
+                elif len(candidates) > k_found:
+                    nearest = np.argpartition(candidate_distances, k_found - 1, axis=1)[:, :k_found]
+                else:
+                    nearest = np.broadcast_to(np.arange(len(candidates)), (len(group), len(candidates)))
+                nearest_distances = np.take_along_axis(candidate_distances, nearest, axis=1)
+                nearest_order = np.argsort(nearest_distances, axis=1, kind="stable")
+
+                rows[group, :k_found] = self.point_rows[candidates[np.take_along_axis(nearest, nearest_order, axis=1)]]
+                distances[group, :k_found] = np.sqrt(np.take_along_axis(nearest_distances, nearest_order, axis=1))
+
+        return rows, distances
+
+    def find_nearest(self, point: Point) -> tuple[int, float]:
+        rows, distances = self.query(x=point.x, y=point.y, k=1)
+        return int(rows[0]), float(distances[0])
+
+    def get_item(self, row: int) -> Any:
+        """
+        The get_item function returns the item of an input row: its data if the tree has data, its id if the tree has
+        ids, and the row itself otherwise.
+        """
+        if self.data is not None:
+            return self.data[row]
+        if self.ids is not None:
+            return self.ids[row]
+        return row
+
+    def find_nearest_nodedata(self, point: Point) -> NodeData:
+        """
+        The find_nearest_nodedata function finds the nearest point to the given point, like
+        Quadtree.find_nearest_nodedata.
+
+        :param point:Point: The query point
+        :return: NodeData with the nearest point's position and item (see get_item)
+        """
+        found = self._search(x=float(point.x), y=float(point.y), k=1)
+        if not found:
+            return None
+
+        position = found[0][1]
+        x, y = self.points[position].tolist()
+        return NodeData(position=Point(x=x, y=y), data=self.get_item(row=int(self.point_rows[position])))
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.points, self.point_rows, self.node_range,
+                                              self.node_bounds, self.node_child))
@@ -0,0 +1,168 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from configs.Cache import LRUCache
+from sources.giphy.Giphy_API_Manager import GiphyClient, GIPHY_CLIENT, normalize_keywords
+
+#############
+# CONSTANTS #
+#############
+
+PAGE_SIZE = 25  # Gifs fetched per request
+LOW_WATERMARK = 5  # A keyword's pool is refilled when it has no more unseen gifs than this
+POOL_MAX_KEYWORDS = 1024
+POOL_TTL = 6 * 60 * 60.0  # Seconds before a keyword's gifs are fetched anew
+REFILL_WORKERS = 2
+
+# The parts of a gif's images dict that are kept (see Gif): Giphy returns about 30 renditions of every gif
+KEPT_RENDITIONS = ("original", "downsized", "downsized_medium", "downsized_small", "fixed_height", "fixed_width")
+KEPT_FIELDS = ("url", "webp", "mp4", "width", "height")
+
+###############
+
+
+def compact_gif_data(gif_data: dict) -> dict:
+    """
+    The compact_gif_data function keeps the id of a gif and the renditions of its images dict that a Gif uses.
+
+    :param gif_data:dict: The data of a gif from the Giphy API
+    :return: A dictionary with the gif's id and images
+    """
+    images = gif_data.get("images") or {}
+    return {
+        "id": gif_data.get("id"),
+        "images": {rendition: {field: images[rendition][field] for field in KEPT_FIELDS if field in images[rendition]}
+                   for rendition in KEPT_RENDITIONS if rendition in images}
+    }
+
+
+class KeywordPool:
+    """
+    A KeywordPool holds the prefetched gifs of a set of keywords: the unseen gifs, the gifs already served (which are
+    served again in rotation when no unseen gif is left) and the offset of the next page of search results.
+    A pool whose search results ran out is complete, and only rotates from then on.
+    """
+    __slots__ = ("unseen", "served", "next_offset", "is_complete", "is_refilling")
+
+    def __init__(self, page_size: int):
+        self.unseen = deque()
+        self.served = deque(maxlen=page_size)
+        self.next_offset = 0
+        self.is_complete = False
+        self.is_refilling = False
+
+    def add_page(self, page: list[dict], page_size: int) -> None:
+        known_ids = {gif_data["id"] for gif_data in self.unseen} | {gif_data["id"] for gif_data in self.served}
+        self.unseen.extend(compact_gif_data(gif_data=gif_data) for gif_data in page
+                           if gif_data.get("id") not in known_ids)
+        self.next_offset += page_size
+        self.is_complete = len(page) < page_size
+
+    def take(self) -> dict | None:
+        if self.unseen:
+            gif_data = self.unseen.popleft()
+        elif self.served:
+            gif_data = self.served.popleft()
+        else:
+            return None
+
+        self.served.append(gif_data)
+        return gif_data
+
+
+class GifPool:
+    """
+    A GifPool serves gifs of keywords from memory. The first search of a set of keywords fetches a page of gifs, and
+    later searches rotate through them, so users don't all get the same gif. When few unseen gifs are left, the next
+    page is fetched in the background.
+    """
+
+    def __init__(self, client: GiphyClient = GIPHY_CLIENT, page_size: int = PAGE_SIZE,
+                 low_watermark: int = LOW_WATERMARK, max_keywords: int = POOL_MAX_KEYWORDS, ttl: float = POOL_TTL):
+        self.client = client
+        self.page_size = page_size
+        self.low_watermark = low_watermark
+
+        self.pools = LRUCache(max_size=max_keywords, ttl=ttl)
+        self._first_fetches = {}  # key -> Future of the pool whose first page is being fetched
+        self._lock = threading.Lock()
+        self._refill_executor = ThreadPoolExecutor(max_workers=REFILL_WORKERS, thread_name_prefix="gif_refill")
+
+    def __repr__(self):
+        return f"<GifPool | Keywords: {len(self.pools)}, Page size: {self.page_size} | {self.pools.stats}>"
+
+    def _fetch_page(self, keywords: tuple[str, ...], offset: int) -> list[dict]:
+        return self.client.search(keywords_list=list(keywords), limit=self.page_size, offset=offset,
+                                  use_cache=False) or []
+
+    def _refill(self, key: str, keywords: tuple[str, ...], pool: KeywordPool) -> None:
+        # Runs in the refill executor, whose futures are never read, so every error is logged here
+        try:
+            page = self._fetch_page(keywords=keywords, offset=pool.next_offset)
+            with self._lock:
+                pool.add_page(page=page, page_size=self.page_size)
+        except Exception as error:
+            print(f"Failed refilling the gifs of {key}: {error!r}")
+        finally:
+            with self._lock:
+                pool.is_refilling = False
+
+    def _get_pool(self, key: str, keywords: tuple[str, ...]) -> KeywordPool:
+        """
+        The _get_pool function returns the pool of a set of keywords, and creates it with the first page of gifs when
+        there is none. Concurrent first searches of the same keywords wait for a single fetch, and share its pool.
+        """
+        with self._lock:
+            pool = self.pools.get(key=key)
+            if pool is not None:
+                return pool
+
+            first_fetch = self._first_fetches.get(key)
+            is_fetching = first_fetch is None
+            if is_fetching:
+                first_fetch = self._first_fetches[key] = Future()
+
+        if not is_fetching:
+            return first_fetch.result()
+
+        try:
+            page = self._fetch_page(keywords=keywords, offset=0)
+            pool = KeywordPool(page_size=self.page_size)
+            pool.add_page(page=page, page_size=self.page_size)
+        except BaseException as error:
+            with self._lock:
+                del self._first_fetches[key]
+            first_fetch.set_exception(error)
+            raise
+
+        with self._lock:
+            self.pools.set(key=key, value=pool)
+            del self._first_fetches[key]
+        first_fetch.set_result(pool)
+        return pool
+
+    def get(self, keywords_list: list[str]) -> dict | None:
+        """
+        The get function returns the data of a gif of keywords: an unseen gif of the keywords' pool, or a served one
+        in rotation. Only the first search of a set of keywords waits for the network.
+
+        :param keywords_list:list: The keywords of the search
+        :return: A dictionary with the gif's id and images, or None if the keywords have no gifs
+        """
+        keywords = normalize_keywords(keywords_list=keywords_list)
+        key = "|".join(keywords)
+
+        pool = self._get_pool(key=key, keywords=keywords)
+        with self._lock:
+            gif_data = pool.take()
+            needs_refill = (len(pool.unseen) <= self.low_watermark and not pool.is_complete
+                            and not pool.is_refilling)
+            if needs_refill:
+                pool.is_refilling = True
+
+        if needs_refill:
+            self._refill_executor.submit(self._refill, key, keywords, pool)
+        return gif_data
+
+
+GIF_POOL = GifPool()
@@ -1,6 +1,10 @@
 import json
+import queue
 import dotenv
-from urllib import parse, request
+from http import client
+from urllib import parse
+from configs import Utils
+from configs.Cache import LRUCache
 
 
 #############
@@ -13,21 +17,46 @@ RESULTS_RATING = "pg"
 RESULTS_LANGUAGE = "en"
 GIPHY_API_KEY = dotenv.get_key(dotenv_path=dotenv.find_dotenv(), key_to_get="GIPHY_KEY")
 
+# Connections kept alive per client, and seconds to wait for a connection or a response
+POOL_SIZE = 8
+REQUEST_TIMEOUT = 5.0
+
+# Search results are cached by their normalized keywords
+CACHE_MAX_SIZE = 512
+CACHE_TTL = 60 * 60.0  # Seconds
+
+# Errors of a kept-alive connection that the server has closed meanwhile
+STALE_CONNECTION_ERRORS = (client.RemoteDisconnected, client.CannotSendRequest, ConnectionResetError,
+                           BrokenPipeError)
+
 #######################
 
 
-def set_giphy_search_url(query: str) -> str:
+def normalize_keywords(keywords_list: list[str]) -> tuple[str, ...]:
+    """
+    The normalize_keywords function cleans, deduplicates and sorts keywords, so that the same set of keywords is
+    searched (and cached) once, regardless of its order and case.
+
+    :param keywords_list:list: The keywords of a search
+    :return: A sorted tuple of the distinct, clean keywords
+    """
+    return tuple(sorted({Utils.clean_word(word=keyword).strip() for keyword in keywords_list} - {""}))
+
+
+def set_giphy_search_url(query: str, limit: int = GIF_LIMIT, offset: int = 0) -> str:
     """
     The set_giphy_search_url function takes a query string and returns the URL for the Giphy API call.
 
     :param query:str: Input query to search the Giphy API
+    :param limit:int: Number of gifs to get
+    :param offset:int: Position of the first gif in the search results
     :return: The url of the api call that will be used to get a gif
     """
     api_call = {
         "api_key": GIPHY_API_KEY,
         "q": query,
-        "limit": GIF_LIMIT,
-        "offset": 0,
+        "limit": limit,
+        "offset": offset,
         "rating": RESULTS_RATING,
         "lang": RESULTS_LANGUAGE
     }
@@ -36,22 +65,123 @@ def set_giphy_search_url(query: str) -> str:
     return SEARCH_URL + api_call_url
 
 
-def call_giphy_api(request_url: str):  # TODO: Error handling
+class GiphyClient:
+    """
+    A GiphyClient sends requests to the Giphy API over a pool of kept-alive connections, so consecutive searches
+    don't pay for new TCP and TLS handshakes. Every request has a timeout, and search results are cached in an
+    LRUCache by their normalized keywords. A client is safe to use from many threads (e.g. the search stages, see
+    Search_Engine.search).
+    """
+
+    def __init__(self, host: str = parse.urlsplit(SEARCH_URL).netloc, use_tls: bool = True,
+                 pool_size: int = POOL_SIZE, timeout: float = REQUEST_TIMEOUT, cache: LRUCache = None):
+        self.host = host
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.cache = LRUCache(max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL) if cache is None else cache
+
+        self._connections = queue.LifoQueue(maxsize=pool_size)  # Idle connections, most recently used first
+        self.connections_opened = 0
+
+    def __repr__(self):
+        return f"<GiphyClient | Host: {self.host}, Connections opened: {self.connections_opened}, Cache: {self.cache}>"
+
+    def _create_connection(self) -> client.HTTPConnection:
+        self.connections_opened += 1
+        connection_class = client.HTTPSConnection if self.use_tls else client.HTTPConnection
+        return connection_class(host=self.host, timeout=self.timeout)
+
+    def _acquire_connection(self) -> tuple[client.HTTPConnection, bool]:
+        # A pooled connection if there is one (which may have been closed by the server), a new one otherwise
+        try:
+            return self._connections.get_nowait(), True
+        except queue.Empty:
+            return self._create_connection(), False
+
+    def _release_connection(self, connection: client.HTTPConnection) -> None:
+        try:
+            self._connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def get_json(self, path: str) -> dict:
+        """
+        The get_json function sends a GET request over a pooled connection and returns its JSON response.
+        A pooled connection that the server has closed is replaced by a new one, and the request is sent again.
+
+        :param path:str: The path and query string of the request
+        :return: The response's JSON
+        """
+        connection, is_pooled = self._acquire_connection()
+        while True:
+            try:
+                connection.request("GET", path, headers={"Connection": "keep-alive"})
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if not is_pooled:
+                    raise
+                connection, is_pooled = self._create_connection(), False
+            except BaseException:
+                connection.close()
+                raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release_connection(connection=connection)
+
+        if response.status != 200:
+            raise ConnectionError(f"Giphy API error {response.status}: {body[:200].decode('utf-8', 'replace')}")
+        return json.loads(body)
+
+    def search(self, keywords_list: list[str], limit: int = GIF_LIMIT, offset: int = 0,
+               use_cache: bool = True) -> list[dict]:
+        """
+        The search function searches gifs of keywords. The results of a set of keywords are fetched once, and then
+        taken from the cache until they expire.
+
+        :param keywords_list:list: The keywords of the search
+        :param limit:int: Number of gifs to get
+        :param offset:int: Position of the first gif in the search results
+        :param use_cache:bool: False to always fetch the results, without caching them (e.g. for a GifPool)
+        :return: The list of gif data retrieved from Giphy
+        """
+        keywords = normalize_keywords(keywords_list=keywords_list)
+
+        def fetch():
+            request_url = parse.urlsplit(set_giphy_search_url(query=" ,".join(keywords), limit=limit, offset=offset))
+            return self.get_json(path=f"{request_url.path}?{request_url.query}").get("data")
+
+        if not use_cache:
+            return fetch()
+        return self.cache.get_or_compute(key=f"{'|'.join(keywords)}#{limit}#{offset}", compute=fetch)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+GIPHY_CLIENT = GiphyClient()
+
+
+def call_giphy_api(request_url: str):
     """
     The search_gif function takes a request URL as an argument, calls the Giphy API and returns the results of that search in JSON format.
     The function uses the Giphy API to make a GET request to their public API, which is documented at https://developers.giphy.com/docs/api#quick-start-guide
+    The request is sent over a kept-alive connection of GIPHY_CLIENT, and times out after REQUEST_TIMEOUT seconds.
 
     :param request_url:str: A formatted URL to call the API with
     :return: A dictionary of gif data retrieved from Giphy
     """
-    with request.urlopen(url=request_url) as response:
-        data = json.loads(response.read())
-    return data
-
+    split_url = parse.urlsplit(request_url)
+    return GIPHY_CLIENT.get_json(path=f"{split_url.path}?{split_url.query}")
 
-def get_gif_data_from_giphy(keywords_list: list[str]) -> dict:
-    keywords_str = " ,".join(keywords_list)
-    request_url = set_giphy_search_url(query=keywords_str)
-    gif_data = call_giphy_api(request_url=request_url).get("data")
 
-    return gif_data
+def get_gif_data_from_giphy(keywords_list: list[str]) -> list[dict]:
+    return GIPHY_CLIENT.search(keywords_list=keywords_list)
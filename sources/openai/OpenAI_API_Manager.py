@@ -1,9 +1,14 @@
 import os
 import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
 import openai
 from openai.openai_object import OpenAIObject
 import sources.openai.OpenAI_Config as OpenAI_Config
 from dotenv import load_dotenv
+from configs.Cache import Cache, LRUCache, SQLiteCache, TieredCache, make_key
 
 #############
 # CONSTANTS #
@@ -14,6 +19,50 @@ openai.api_key = os.getenv('OPENAI_API_KEY')
 EXAMPLE_PATH = "./api_managers/"
 EXAMPLE_QUERY = "I just failed my last test and i dont know how things are going to turn out. im bumped and have zero energy"
 
+# Responses are cached in memory, and on disk too when OPENAI_CACHE_PATH is set
+CACHE_MAX_SIZE = 1024
+CACHE_TTL = 7 * 24 * 60 * 60.0  # Seconds
+CACHE_PATH = os.getenv('OPENAI_CACHE_PATH')
+
+
+def create_response_cache() -> Cache:
+    return TieredCache(memory=LRUCache(max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL),
+                       disk=None if not CACHE_PATH else SQLiteCache(path=CACHE_PATH, ttl=CACHE_TTL))
+
+
+RESPONSE_CACHE = create_response_cache()
+
+# Batch mode: queries per completion request, concurrent requests, and retries of rate limited requests
+BATCH_SIZE = 20
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # Seconds before the first retry, doubled on every retry
+BACKOFF_MAX = 60.0
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                    openai.error.APIConnectionError)
+
+
+def openai_backend(prompts: list[str], config: dict) -> OpenAIObject:
+    """
+    The openai_backend function sends prompts in a single completion request. The response has a choice per prompt,
+    whose index is the prompt's position in the list.
+
+    :param prompts:list: The prompts (see generate_prompt)
+    :param config:dict: The model config (see OpenAI_Config.config)
+    :return: The OpenAI response
+    """
+    return openai.Completion.create(
+        model=config["model"],
+        prompt=prompts if len(prompts) > 1 else prompts[0],
+        temperature=config["temp"],
+        top_p=config["top_p"],
+        max_tokens=config["max_tokens"],
+        stop=config["stop"]
+    )
+
+
+COMPLETION_BACKEND = openai_backend
+
 
 ###############
 
@@ -30,16 +79,8 @@ def get_OpenAI_analysis(query="", is_example_response=False,
     :param create_new_example: Create a new example response from the openai api
     :return: A dictionary with three keys:
     """
-    config = OpenAI_Config.config
     if not is_example_response:  # Later to be used as the main algorithm
-        response = openai.Completion.create(
-            model=config["model"],
-            prompt=generate_prompt(query=query),
-            temperature=config["temp"],
-            top_p=config["top_p"],
-            max_tokens=config["max_tokens"],
-            stop=config["stop"]
-        )
+        response = request_analysis(query=query)
 
         # print(f"OpenAI Response: {response}")
 
@@ -55,6 +96,136 @@ def get_OpenAI_analysis(query="", is_example_response=False,
     return response
 
 
+def request_analysis(query: str) -> OpenAIObject:
+    """
+    The request_analysis function returns the OpenAI model's analysis of a query. Queries are normalized (see
+    normalize_query), and the responses of repeated queries come from RESPONSE_CACHE when it is set.
+
+    :param query:str: User's input text
+    :return: The OpenAI response, or its JSON dictionary when it was cached on disk
+    """
+    config = OpenAI_Config.config
+    prompt = generate_prompt(query=normalize_query(query=query))
+
+    def create_completion():
+        return request_completions(prompts=[prompt], config=config)
+
+    if RESPONSE_CACHE is None:
+        return create_completion()
+    return RESPONSE_CACHE.get_or_compute(key=make_key(prompt, config), compute=create_completion)
+
+
+def request_completions(prompts: list[str], config: dict, max_retries: int = MAX_RETRIES):
+    """
+    The request_completions function sends prompts to COMPLETION_BACKEND in a single request. Rate limited and
+    failed connections are retried up to max_retries times, with an exponential backoff and a random jitter.
+
+    :param prompts:list: The prompts (see generate_prompt)
+    :param config:dict: The model config (see OpenAI_Config.config)
+    :param max_retries:int: Number of retries before the error is raised
+    :return: The backend's response
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return COMPLETION_BACKEND(prompts=prompts, config=config)
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.0))
+
+
+def split_response(response, prompts_count: int) -> list[dict]:
+    """
+    The split_response function demultiplexes the response of a batched request into a response per prompt, in the
+    format of a single prompt's response, so each can be parsed with extract_response_info and cached on its own.
+
+    :param response: The response of a batched request
+    :param prompts_count:int: Number of prompts in the request
+    :return: A list of response dictionaries, in the order of the prompts
+    """
+    responses = [None] * prompts_count
+    for choice in response["choices"]:
+        responses[choice["index"]] = {"choices": [{"text": choice["text"], "index": 0}]}
+
+    if any(prompt_response is None for prompt_response in responses):
+        raise ValueError(f"Expected {prompts_count} choices, got {len(response['choices'])}")
+    return responses
+
+
+def get_OpenAI_analyses(queries: Sequence[str], batch_size: int = BATCH_SIZE,
+                        max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+                        max_retries: int = MAX_RETRIES) -> list[dict]:
+    """
+    The get_OpenAI_analyses function analyzes many queries, e.g. a backfill of stored entries. Queries are normalized
+    and deduplicated, and cached queries are not sent (see RESPONSE_CACHE). The others are packed batch_size prompts
+    per completion request, and at most max_concurrent_requests requests are sent at once.
+
+    :param queries:Sequence: Users' input texts
+    :param batch_size:int: Number of prompts per completion request
+    :param max_concurrent_requests:int: Number of requests sent concurrently
+    :param max_retries:int: Number of retries of a rate limited request (see request_completions)
+    :return: A response per query, in the format of a single query's response (see split_response)
+    """
+    config = OpenAI_Config.config
+    prompts = [generate_prompt(query=normalize_query(query=query)) for query in queries]
+
+    responses_by_prompt = {}
+    missing_prompts = []
+    for prompt in dict.fromkeys(prompts):
+        cached = None if RESPONSE_CACHE is None else RESPONSE_CACHE.get(key=make_key(prompt, config))
+        if cached is None:
+            missing_prompts.append(prompt)
+        else:
+            responses_by_prompt[prompt] = cached
+
+    def request_batch(batch_prompts: list[str]) -> list[dict]:
+        start_time = time.perf_counter()
+        batch_responses = split_response(response=request_completions(prompts=batch_prompts, config=config,
+                                                                       max_retries=max_retries),
+                                         prompts_count=len(batch_prompts))
+        if RESPONSE_CACHE is not None:
+            RESPONSE_CACHE.stats.add_miss_time(seconds=time.perf_counter() - start_time)
+            for prompt, response in zip(batch_prompts, batch_responses):
+                RESPONSE_CACHE.set(key=make_key(prompt, config), value=response)
+        return batch_responses
+
+    batches = [missing_prompts[start:start + batch_size] for start in range(0, len(missing_prompts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(max_concurrent_requests, 1)) as executor:
+        for batch_prompts, batch_responses in zip(batches, executor.map(request_batch, batches)):
+            responses_by_prompt.update(zip(batch_prompts, batch_responses))
+
+    return [responses_by_prompt[prompt] for prompt in prompts]
+
+
+def set_completion_backend(backend: Callable[[list[str], dict], dict] | None) -> None:
+    """
+    The set_completion_backend function replaces the backend of the completion requests, e.g. with an
+    OpenAI_Stub_Backend.StubBackend to run offline. None restores the OpenAI backend.
+
+    :param backend: A function of a list of prompts and a model config, returning a response with a choice per prompt
+    :return: None
+    """
+    global COMPLETION_BACKEND
+    COMPLETION_BACKEND = openai_backend if backend is None else backend
+
+
+def set_response_cache(cache: Cache | None) -> None:
+    """
+    The set_response_cache function replaces the cache of OpenAI responses, e.g. with a cache of another size or
+    tier. None turns the caching off.
+
+    :param cache:Cache: Any object with the get_or_compute method of configs.Cache
+    :return: None
+    """
+    global RESPONSE_CACHE
+    RESPONSE_CACHE = cache
+
+
+def normalize_query(query: str) -> str:
+    # Queries that only differ by case or whitespace get the same analysis
+    return " ".join(query.split()).lower()
+
+
 def generate_prompt(query: str) -> str:
     """
     The generate_prompt function takes in a string of text entered by the user (his story) and returns a ready-to-use
@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import deque
+from hashlib import sha256
+import openai
+import sources.openai.OpenAI_Config as OpenAI_Config
+
+#############
+# CONSTANTS #
+#############
+
+STUB_EMOTIONS = ("joy", "sadness", "anger", "fear", "calm", "excitement", "love", "hope", "boredom", "surprise")
+
+###############
+
+
+class StubBackend:
+    """
+    A StubBackend answers completion requests locally, like the OpenAI backend (see OpenAI_API_Manager.openai_backend),
+    so that the batch mode can be run and benchmarked offline:
+        - A request takes request_latency seconds, plus prompt_latency seconds per prompt
+        - More than rate_limit requests in a second raise openai.error.RateLimitError, like the API's rate limit
+        - Every prompt gets 3 distinct emotions, picked by hashing it, and its 3 longest words as keywords
+    Use it with OpenAI_API_Manager.set_completion_backend(StubBackend()).
+    """
+
+    def __init__(self, request_latency: float = 0.5, prompt_latency: float = 0.01, rate_limit: int = None):
+        self.request_latency = request_latency
+        self.prompt_latency = prompt_latency
+        self.rate_limit = rate_limit
+
+        self.requests = 0
+        self.rate_limited_requests = 0
+        self._request_times = deque()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<StubBackend | Requests: {self.requests}, Rate limited: {self.rate_limited_requests}>"
+
+    def __call__(self, prompts: list[str], config: dict) -> dict:
+        self._check_rate_limit()
+        time.sleep(self.request_latency + self.prompt_latency * len(prompts))
+
+        return {
+            "model": config["model"],
+            "choices": [{"text": self.complete(prompt=prompt), "index": index} for index, prompt in enumerate(prompts)]
+        }
+
+    def _check_rate_limit(self) -> None:
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit is None:
+                return
+
+            now = time.monotonic()
+            while self._request_times and self._request_times[0] <= now - 1.0:
+                self._request_times.popleft()
+
+            if len(self._request_times) >= self.rate_limit:
+                self.rate_limited_requests += 1
+                raise openai.error.RateLimitError("Rate limit reached for requests")
+            self._request_times.append(now)
+
+    @staticmethod
+    def complete(prompt: str) -> str:
+        """
+        The complete function creates the completion of a prompt, in the format asked by OpenAI_Config.INPUT_SUFFIX.
+
+        :param prompt:str: A prompt created by generate_prompt
+        :return: The text of the prompt's completion
+        """
+        query = prompt.split(OpenAI_Config.INPUT_SUFFIX)[0].strip().strip("\"")
+        emotions = sorted(STUB_EMOTIONS, key=lambda emotion: sha256(f"{query}|{emotion}".encode("utf-8")).digest())[:3]
+        keywords = sorted({word.strip(".,!?") for word in query.split()}, key=lambda word: (-len(word), word))[:3]
+
+        return f"\n\n\"emotions\": {', '.join(emotions)}\n\"keywords\": {', '.join(keywords)}"
@@ -0,0 +1,63 @@
+from search_engine.analyzers.Text_Analyzer import Analyzer, BATCH_COLUMNS
+import numpy as np
+import pandas as pd
+import sys
+
+################
+# Headless verification of Analyzer.analyze_batch.
+# Every text of the batch is also analyzed alone with Analyzer.analyze, and the batch's row must match its analysis.
+# Texts are strings, lists or tuples of words. Missing values of a DataFrame column (NaN, None) must be analyzed as
+# empty texts instead of failing the batch.
+# Run from the repository's root:
+#   python -m tests.analyzer_tests.Text_Analyzer_verification
+# The exit code is 1 if any row didn't match.
+################
+
+TEXTS = [
+    "I feel happy and full of joy today",
+    "a sad, lonely and rainy evening...",
+    ["angry", "loud", "music"],
+    ("happy", "joy", "sad"),
+    "",
+    "words that are not in the lexicon: qwzx vbnmp",
+    "Happy happy HAPPY!",
+]
+MISSING_VALUES = [np.nan, None]
+VALUE_TOLERANCE = 1e-9
+
+
+def check_batch(analyzer: Analyzer, texts: list, expected_texts: list) -> int:
+    batch_df = analyzer.analyze_batch(texts=pd.Series(texts, dtype=object))
+    assert list(batch_df.columns) == BATCH_COLUMNS and len(batch_df) == len(texts)
+
+    mismatches = 0
+    for (_, row), expected_text in zip(batch_df.iterrows(), expected_texts):
+        analysis = analyzer.analyze(text=expected_text)
+        is_match = (row["total_tokens"] == analysis.total_tokens and
+                    row["tokens_in_lexicon"] == analysis.tokens_in_lexicon and
+                    abs(row["energy"] - analysis.energy) <= VALUE_TOLERANCE and
+                    abs(row["valence"] - analysis.valence) <= VALUE_TOLERANCE and
+                    abs(row["rating"] - analysis.rating) <= VALUE_TOLERANCE)
+        if not is_match:
+            mismatches += 1
+            print(f"Mismatch for {expected_text!r}:\n\tbatch: {row.to_dict()}\n\tanalyze: {analysis}")
+
+    return mismatches
+
+
+def main() -> int:
+    analyzer = Analyzer()
+
+    mismatches = check_batch(analyzer=analyzer, texts=TEXTS, expected_texts=TEXTS)
+
+    # Missing values between the texts, as in a DataFrame column with empty cells
+    texts_with_missing = [*MISSING_VALUES, *TEXTS[:3], *MISSING_VALUES, *TEXTS[3:]]
+    expected_texts = [text if isinstance(text, (str, list, tuple)) else "" for text in texts_with_missing]
+    mismatches += check_batch(analyzer=analyzer, texts=texts_with_missing, expected_texts=expected_texts)
+
+    print(f"Checked {len(TEXTS) + len(texts_with_missing)} texts, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
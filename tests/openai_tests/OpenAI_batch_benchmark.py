@@ -0,0 +1,70 @@
+from sources.openai import OpenAI_API_Manager
+from sources.openai.OpenAI_Stub_Backend import StubBackend
+from search_engine.QueryData import QueryData
+from argparse import ArgumentParser
+import random
+import time
+
+################
+# Offline benchmark of the OpenAI batch mode, on the local stub backend.
+# Run from the repository's root:
+#   python -m tests.openai_tests.OpenAI_batch_benchmark --queries 2000 --batch-size 20 --concurrency 4
+################
+
+WORDS = ("sea", "surf", "early", "sleep", "joy", "tired", "exam", "failed", "friends", "proposed", "rain", "energy",
+         "house", "bed", "difficult", "happy", "lonely", "music", "dance", "waiting")
+
+parser = ArgumentParser()
+parser.add_argument("--queries", type=int, default=2000, help="Number of queries to analyze")
+parser.add_argument("--repeats", type=float, default=0.1, help="Share of repeated queries")
+parser.add_argument("--batch-size", type=int, default=OpenAI_API_Manager.BATCH_SIZE)
+parser.add_argument("--concurrency", type=int, default=OpenAI_API_Manager.MAX_CONCURRENT_REQUESTS)
+parser.add_argument("--request-latency", type=float, default=0.2, help="Seconds per stub request")
+parser.add_argument("--prompt-latency", type=float, default=0.005, help="Seconds per prompt of a stub request")
+parser.add_argument("--rate-limit", type=int, default=None, help="Stub requests per second")
+parser.add_argument("--sequential-queries", type=int, default=20, help="Number of queries of the one-by-one baseline")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def generate_queries(n_queries: int, repeats: float, rng: random.Random) -> list[str]:
+    queries = []
+    for _ in range(n_queries):
+        if queries and rng.random() < repeats:
+            queries.append(rng.choice(queries))
+        else:
+            queries.append(" ".join(rng.choices(WORDS, k=rng.randint(5, 30))))
+    return queries
+
+
+def main(n_queries: int, repeats: float, batch_size: int, concurrency: int, request_latency: float,
+         prompt_latency: float, rate_limit: int, n_sequential_queries: int, seed: int):
+    rng = random.Random(seed)
+    queries = generate_queries(n_queries=n_queries, repeats=repeats, rng=rng)
+
+    backend = StubBackend(request_latency=request_latency, prompt_latency=prompt_latency, rate_limit=rate_limit)
+    OpenAI_API_Manager.set_completion_backend(backend=backend)
+
+    # One request per query
+    OpenAI_API_Manager.set_response_cache(cache=None)
+    start_time = time.perf_counter()
+    for query in queries[:n_sequential_queries]:
+        QueryData.fetch(query=query)
+    sequential_time = (time.perf_counter() - start_time) / n_sequential_queries
+    print('One by one: {:8.2f} ms per query'.format(sequential_time * 1e3))
+
+    OpenAI_API_Manager.set_response_cache(cache=OpenAI_API_Manager.create_response_cache())
+    start_time = time.perf_counter()
+    query_datas = QueryData.fetch_many(queries=queries, batch_size=batch_size, max_concurrent_requests=concurrency)
+    batch_time = time.perf_counter() - start_time
+    print('Batch mode: {:8.2f} ms per query, {:d} queries in {:6.2f} seconds ({:.0f}x), {:d} failed'.format(
+        batch_time / n_queries * 1e3, n_queries, batch_time, sequential_time * n_queries / batch_time,
+        sum(query_data is None for query_data in query_datas)))
+    print(f'Backend: {backend}')
+    print(f'Cache: {OpenAI_API_Manager.RESPONSE_CACHE.stats}')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    main(n_queries=args.queries, repeats=args.repeats, batch_size=args.batch_size, concurrency=args.concurrency,
+         request_latency=args.request_latency, prompt_latency=args.prompt_latency, rate_limit=args.rate_limit,
+         n_sequential_queries=args.sequential_queries, seed=args.seed)
@@ -34,12 +34,14 @@ def create_csv_of_top_tracks():
                     href=track.href,
                     mood_vec=mood_vec
                     )
-        pd_formt_song = song.__dict__
-        pd_formt_song.pop("mood_vec")
-        pd_formt_song.update({
+        pd_formt_song = {
+            "title": song.title,
+            "artist": song.artist,
+            "spotify_ID": song.spotify_ID,
+            "href": song.href,
             "energy": mood_vec.energy,
             "valence": mood_vec.valence
-        })
+        }
         songs.append(pd_formt_song)
     songs_df = pd.DataFrame(songs)
     songs_df.to_csv("tomer_top_50_songs.csv")
@@ -105,12 +107,12 @@ def add_search_points_to_drawing(rand_point: Point, closest_point: Point, candid
 
 
 def create_quad_from_csv(path: str = "", test: bool = False) -> list[Song]:
+    global quadtree
     if test:
         path = "/Users/tomermildworth/Desktop/Coding/FeelMe/feelme/tests/quad_tests/tomer_top_50_songs.csv"
     start_time = time.perf_counter()
     songs = load_songs_csv(path=path)
-    for song in songs:
-        quadtree.insert_data(data=song)
+    quadtree = Quadtree.from_songs(songs=songs)
     end_time = time.perf_counter()
     print('Quadtree build time: {:6.7f} seconds for {:d} songs'.format(end_time - start_time, len(songs)))
     return songs
@@ -0,0 +1,194 @@
+from items.MoodVec import MoodVec
+from items.Song import Song
+from sources.db.quadtree.Quadtree import Quadtree, Point, DEFAULT_BUCKET_CAPACITY
+from argparse import ArgumentParser
+import numpy as np
+import time
+import gc
+import tracemalloc
+
+################
+# Quadtree build and search benchmark.
+# Run from the repository's root:
+#   python -m tests.quad_tests.Quadtree_benchmark --songs 50000 --queries 1000
+# The nearest-song searches are checked against a brute-force search, and a wrong result fails the benchmark.
+# Quadtree_benchmark_reference.txt holds the numbers of earlier versions of the tree, to compare a run against.
+################
+
+DISTANCE_TOLERANCE = 1e-12  # math.hypot and NumPy's square root of sums may differ in the last bits
+
+parser = ArgumentParser()
+parser.add_argument("--songs", type=int, default=50000, help="Number of songs to insert")
+parser.add_argument("--queries", type=int, default=1000, help="Number of nearest-song queries")
+parser.add_argument("--batch-queries", type=int, default=100000, help="Number of queries in the batch search")
+parser.add_argument("--capacity", type=int, default=DEFAULT_BUCKET_CAPACITY, help="Bucket capacity of the leaves")
+parser.add_argument("--deep-songs", type=int, default=2000, help="Number of songs in the deep tree benchmark")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def generate_songs(n_songs: int, rng: np.random.Generator) -> list[Song]:
+    # Spotify audio features have 3 decimals, so some songs share their positions
+    positions = np.floor(rng.random((n_songs, 2)) * 1000) / 1000
+    return [Song(title=f"song {i}", artist="artist", spotify_ID=str(i), mood_vec=MoodVec(energy=x, valence=y))
+            for i, (x, y) in enumerate(positions.tolist())]
+
+
+def insert_songs(songs: list[Song], capacity: int = DEFAULT_BUCKET_CAPACITY) -> Quadtree:
+    quadtree = Quadtree(capacity=capacity)
+    for song in songs:
+        quadtree.insert_data(data=song)
+    return quadtree
+
+
+def benchmark_build(build, songs: list[Song]) -> tuple[Quadtree, float, int]:
+    # Timed and traced separately, as tracing every allocation distorts the build time
+    start_time = time.perf_counter()
+    quadtree = build(songs)
+    end_time = time.perf_counter()
+
+    tracemalloc.start()
+    build(songs)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return quadtree, end_time - start_time, peak_memory
+
+
+def benchmark_memory(n_songs: int, capacity: int, seed: int) -> tuple[float, float]:
+    """
+    The benchmark_memory function measures the memory an indexed song takes: its Song and MoodVec, and its share of
+    the tree (NodeData, Point, Node and Frame objects). Unlike the build's peak memory, only the memory that is kept
+    after the build is counted.
+
+    :param n_songs:int: Number of songs to index
+    :param capacity:int: Bucket capacity of the leaves
+    :param seed:int: Seed of the songs' generator
+    :return: The bytes per song of the songs alone, and of the indexed songs
+    """
+    rng = np.random.default_rng(seed)
+    positions = np.floor(rng.random((n_songs, 2)) * 1000) / 1000
+
+    tracemalloc.start()
+    songs = [Song(title=f"song {i}", artist="artist", spotify_ID=str(i), mood_vec=MoodVec(energy=x, valence=y))
+             for i, (x, y) in enumerate(positions.tolist())]
+    songs_memory, _ = tracemalloc.get_traced_memory()
+    quadtree = insert_songs(songs=songs, capacity=capacity)
+    indexed_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del quadtree
+    return songs_memory / n_songs, indexed_memory / n_songs
+
+
+def check_nearest(songs: list[Song], points: np.ndarray, nearest: list) -> None:
+    """
+    The check_nearest function compares the distances of the nearest songs found by the tree with a brute-force search.
+
+    :raises AssertionError: If any search didn't find a nearest song
+    """
+    positions = np.array([(song.mood_vec.energy, song.mood_vec.valence) for song in songs], dtype=np.float64)
+    expected = np.array([np.sqrt(np.min(np.sum((positions - point) ** 2, axis=1))) for point in points])
+    found = np.array([np.inf if node_data is None else
+                      np.hypot(node_data.position.x - x, node_data.position.y - y)
+                      for node_data, (x, y) in zip(nearest, points.tolist())])
+
+    wrong_searches = int(np.sum(np.abs(found - expected) > DISTANCE_TOLERANCE))
+    assert wrong_searches == 0, f"{wrong_searches} of {len(points)} searches didn't find the nearest song"
+
+
+def benchmark_search(quadtree: Quadtree, points: np.ndarray) -> tuple[float, int, list]:
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    nearest = [quadtree.find_nearest_nodedata(point=Point(x=x, y=y)) for x, y in points.tolist()]
+    end_time = time.perf_counter()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return end_time - start_time, peak_memory, nearest
+
+
+def benchmark_deep_tree(n_songs: int, rng: np.random.Generator) -> tuple[int, float, float]:
+    """
+    The benchmark_deep_tree function measures the descent to a point's node and the neighbor finding in a tree deeper
+    than 20 levels: the songs are packed in a tiny square, and every leaf holds a single song.
+
+    :param n_songs:int: Number of songs in the tree
+    :param rng:np.random.Generator: Generator of the songs' positions
+    :return: The tree's depth, the time per descent and the time per neighbor search
+    """
+    positions = 0.3 + rng.random((n_songs, 2)) * 1e-5
+    quadtree = Quadtree.from_arrays(energy=positions[:, 0], valence=positions[:, 1], capacity=1,
+                                    min_cell_size=1e-9)
+
+    leaves, nodes_stack = [], [quadtree.root]
+    while nodes_stack:
+        node = nodes_stack.pop()
+        if node.is_leaf():
+            leaves.append(node)
+        nodes_stack.extend(child for child in node.children if child is not None)
+
+    # The build leaves the garbage collector due a full collection, which would be timed as part of the descents
+    gc.collect()
+
+    start_time = time.perf_counter()
+    for x, y in positions.tolist():
+        quadtree.find_containing_node(point=Point(x=x, y=y))
+    descent_time = (time.perf_counter() - start_time) / n_songs
+
+    start_time = time.perf_counter()
+    for leaf in leaves:
+        for direction in ("N", "S", "W", "E"):
+            leaf.get_neighbor_of_greater_or_equal_size(direction=direction)
+    neighbor_time = (time.perf_counter() - start_time) / (4 * len(leaves))
+
+    return max(leaf.depth for leaf in leaves), descent_time, neighbor_time
+
+
+def benchmark_batch_search(quadtree: Quadtree, points: np.ndarray) -> tuple[float, float]:
+    start_time = time.perf_counter()
+    quadtree.get_snapshot()
+    snapshot_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    quadtree.query_batch(points=points, k=1)
+    return snapshot_time, time.perf_counter() - start_time
+
+
+def main(n_songs: int, n_queries: int, n_batch_queries: int, n_deep_songs: int, capacity: int, seed: int):
+    rng = np.random.default_rng(seed)
+    songs = generate_songs(n_songs=n_songs, rng=rng)
+
+    quadtree, build_time, build_peak = benchmark_build(
+        build=lambda build_songs: insert_songs(songs=build_songs, capacity=capacity), songs=songs)
+    print('Quadtree build time: {:6.4f} seconds for {:d} songs, peak memory: {:6.2f} MB'.format(
+        build_time, len(songs), build_peak / 2 ** 20))
+
+    _, bulk_build_time, bulk_build_peak = benchmark_build(
+        build=lambda build_songs: Quadtree.from_songs(songs=build_songs, capacity=capacity), songs=songs)
+    print('Quadtree bulk build time: {:6.4f} seconds for {:d} songs, peak memory: {:6.2f} MB'.format(
+        bulk_build_time, len(songs), bulk_build_peak / 2 ** 20))
+
+    songs_bytes, indexed_bytes = benchmark_memory(n_songs=n_songs, capacity=capacity, seed=seed)
+    print('Memory per indexed song: {:6.1f} bytes ({:6.1f} bytes of Song objects, {:6.1f} bytes of tree)'.format(
+        indexed_bytes, songs_bytes, indexed_bytes - songs_bytes))
+
+    search_points = rng.random((n_queries, 2))
+    search_time, search_peak, nearest = benchmark_search(quadtree=quadtree, points=search_points)
+    check_nearest(songs=songs, points=search_points, nearest=nearest)
+    print('Total search time: {:6.4f} seconds for {:d} points ({:6.1f} us per point), peak memory: {:6.3f} MB'.format(
+        search_time, n_queries, search_time / n_queries * 1e6, search_peak / 2 ** 20))
+
+    depth, descent_time, neighbor_time = benchmark_deep_tree(n_songs=n_deep_songs, rng=rng)
+    print('Deep tree of depth {:d}: descent {:6.2f} us, greater-or-equal neighbor {:6.2f} us'.format(
+        depth, descent_time * 1e6, neighbor_time * 1e6))
+
+    batch_points = rng.random((n_batch_queries, 2))
+    snapshot_time, batch_time = benchmark_batch_search(quadtree=quadtree, points=batch_points)
+    print('Batch search time: {:6.4f} seconds for {:d} points ({:6.1f} us per point), snapshot time: {:6.4f} seconds'
+          .format(batch_time, n_batch_queries, batch_time / n_batch_queries * 1e6, snapshot_time))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    main(n_songs=args.songs, n_queries=args.queries, n_batch_queries=args.batch_queries,
+         n_deep_songs=args.deep_songs, capacity=args.capacity, seed=args.seed)
@@ -0,0 +1,257 @@
+from sources.db.quadtree.Quadtree import Quadtree, Point, NodeData
+from items.MoodVec import MoodVec
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+import numpy as np
+import platform
+import resource
+import json
+import time
+import sys
+
+################
+# Headless Quadtree verification and benchmark suite.
+# Every case builds a tree over a generated point set, checks find_nearest_nodedata and query_batch against a
+# brute-force NumPy oracle, and measures the build time, query latencies, candidates examined per query and the peak
+# RSS. Every case runs in a fresh process, so its peak RSS is its own.
+# The tree then goes through a random sequence of inserts, removes and updates. Afterwards, no parent may be left whose
+# children are leaves that fit in a single bucket, and the searches are checked again against the remaining points.
+# Run from the repository's root:
+#   python -m tests.quad_tests.Quadtree_verification --sizes 1000 100000 --output results.json
+# The exit code is 1 if any query didn't return the nearest point, or if the tree wasn't collapsed after the updates.
+################
+
+DISTRIBUTIONS = ("uniform", "clustered", "duplicates")
+ORACLE_CHUNK_SIZE = 2 ** 22  # Maximal number of distances the oracle computes at once
+DISTANCE_TOLERANCE = 1e-12  # math.hypot and the oracle's square root of sums may differ in the last bits
+BATCH_DISTANCE_TOLERANCE = 1e-6  # The batch search runs on float32 positions
+
+parser = ArgumentParser()
+parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                    help="Numbers of points (a build takes about 1.5 KB per point, so 10M points need about 15 GB)")
+parser.add_argument("--distributions", nargs="*", default=list(DISTRIBUTIONS), choices=DISTRIBUTIONS)
+parser.add_argument("--queries", type=int, default=1000, help="Number of queries per case")
+parser.add_argument("--updates", type=int, default=3000, help="Number of inserts, removes and updates per case")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--output", help="Path of the JSON report. Printed when not given")
+
+
+def generate_points(distribution: str, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    The generate_points function generates points in the tree's frame, [0, 1) on both axes.
+        - uniform: Uniformly distributed points
+        - clustered: Points around 20 random centers
+        - duplicates: Points drawn from a tenth as many positions, with 3 decimals like Spotify's audio features
+    """
+    match distribution:
+        case "uniform":
+            points = rng.random((size, 2))
+        case "clustered":
+            centers = rng.random((20, 2))
+            points = centers[rng.integers(len(centers), size=size)] + rng.normal(scale=0.02, size=(size, 2))
+        case "duplicates":
+            positions = np.floor(rng.random((max(size // 10, 1), 2)) * 1000) / 1000
+            points = positions[rng.integers(len(positions), size=size)]
+        case _:
+            raise ValueError(f"Unknown distribution: {distribution}")
+
+    return np.clip(points, 0.0, np.nextafter(1.0, 0.0))
+
+
+def generate_queries(points: np.ndarray, n_queries: int, rng: np.random.Generator) -> np.ndarray:
+    # Random points, points of the set, and points on the borders of the tree's frames
+    n_on_points, n_on_borders = n_queries // 10, n_queries // 10
+    on_points = points[rng.integers(len(points), size=n_on_points)]
+    on_borders = np.floor(rng.random((n_on_borders, 2)) * 16) / 16
+    random_points = rng.random((n_queries - n_on_points - n_on_borders, 2))
+    return np.concatenate((random_points, on_points, on_borders))
+
+
+def oracle_distances(points: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    The oracle_distances function computes the distance from every query to its nearest point by brute force.
+
+    :param points:np.ndarray: (N, 2) array of the points
+    :param queries:np.ndarray: (Q, 2) array of the queries
+    :return: (Q,) array of the distances
+    """
+    distances = np.empty(len(queries))
+    chunk_size = max(ORACLE_CHUNK_SIZE // len(points), 1)
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start:start + chunk_size]
+        squared = ((chunk[:, 0:1] - points[:, 0]) ** 2 + (chunk[:, 1:2] - points[:, 1]) ** 2)
+        distances[start:start + chunk_size] = np.sqrt(squared.min(axis=1))
+    return distances
+
+
+def count_unmerged_nodes(quadtree: Quadtree) -> int:
+    """
+    The count_unmerged_nodes function counts the nodes that Node.collapse should have fixed: empty leaves other than
+    the root, and parents whose children are leaves with at most capacity NodeData altogether.
+    """
+    unmerged_nodes = 0
+    nodes = [quadtree.root]
+    while nodes:
+        node = nodes.pop()
+        children = [child for child in node.children if child is not None]
+
+        if not children:
+            unmerged_nodes += int(not node.bucket and node.parent is not None)
+        elif all(child.is_leaf() for child in children) and \
+                sum(len(child.bucket) for child in children) <= quadtree.capacity:
+            unmerged_nodes += 1
+
+        nodes.extend(children)
+
+    return unmerged_nodes
+
+
+def run_updates(quadtree: Quadtree, points: np.ndarray, n_updates: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    The run_updates function inserts, removes and updates random points of a tree built from_arrays, whose data ids
+    are the points' rows. New points get the next ids.
+
+    :return: (N, 2) array of the points left in the tree
+    """
+    positions = {row: position for row, position in enumerate(points.tolist())}
+    ids = list(positions)
+
+    for step, operation in enumerate(rng.integers(3, size=n_updates).tolist()):
+        x, y = rng.random(2).tolist()
+
+        if operation == 0 or not ids:
+            new_id = len(points) + step
+            quadtree.insert_nodedata(node_data=NodeData(position=Point(x=x, y=y), data=new_id))
+            positions[new_id] = (x, y)
+            ids.append(new_id)
+            continue
+
+        index = int(rng.integers(len(ids)))
+        data_id = ids[index]
+        if operation == 1:
+            quadtree.remove(song_id=data_id)
+            del positions[data_id]
+            ids[index] = ids[-1]
+            ids.pop()
+        else:
+            quadtree.update(song_id=data_id, new_mood_vec=MoodVec(energy=x, valence=y))
+            positions[data_id] = (x, y)
+
+    return np.array(list(positions.values()), dtype=np.float64).reshape(-1, 2)
+
+
+def get_peak_rss() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(np.max(values))
+    }
+
+
+def run_case(distribution: str, size: int, n_queries: int, n_updates: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    points = generate_points(distribution=distribution, size=size, rng=rng)
+    queries = generate_queries(points=points, n_queries=n_queries, rng=rng)
+
+    # The tree's messages go to stderr, stdout may be the JSON report
+    with redirect_stdout(sys.stderr):
+        start_time = time.perf_counter()
+        quadtree = Quadtree.from_arrays(energy=points[:, 0], valence=points[:, 1])
+        build_time = time.perf_counter() - start_time
+    build_peak_rss = get_peak_rss()
+
+    expected = oracle_distances(points=points, queries=queries)
+
+    latencies, candidates_counts, mismatches = [], [], 0
+    for (x, y), expected_distance in zip(queries.tolist(), expected.tolist()):
+        point = Point(x=x, y=y)
+
+        start_time = time.perf_counter()
+        quadtree.find_nearest_nodedata(point=point)
+        latencies.append((time.perf_counter() - start_time) * 1e6)
+
+        nearest, candidates = quadtree.find_nearest_nodedata(point=point, with_candidates=True)
+        candidates_counts.append(len(candidates))
+        if nearest is None or abs(nearest.position.distance_to(other=point) - expected_distance) > DISTANCE_TOLERANCE:
+            mismatches += 1
+
+    start_time = time.perf_counter()
+    _, batch_distances = quadtree.query_batch(points=queries, k=1)
+    batch_time = time.perf_counter() - start_time
+    batch_mismatches = int(np.sum(np.abs(batch_distances[:, 0] - expected) > BATCH_DISTANCE_TOLERANCE))
+
+    with redirect_stdout(sys.stderr):
+        updated_points = run_updates(quadtree=quadtree, points=points, n_updates=n_updates, rng=rng)
+    unmerged_nodes = count_unmerged_nodes(quadtree=quadtree)
+
+    updated_expected = oracle_distances(points=updated_points, queries=queries)
+    update_mismatches = int(quadtree.total_leaves != len(updated_points) or
+                            len(quadtree.nodedata_by_id) != len(updated_points))
+    for (x, y), expected_distance in zip(queries.tolist(), updated_expected.tolist()):
+        point = Point(x=x, y=y)
+        nearest = quadtree.find_nearest_nodedata(point=point)
+        if nearest is None or abs(nearest.position.distance_to(other=point) - expected_distance) > DISTANCE_TOLERANCE:
+            update_mismatches += 1
+
+    return {
+        "distribution": distribution,
+        "size": size,
+        "tree_points": quadtree.total_leaves,
+        "queries": len(queries),
+        "build_seconds": build_time,
+        "build_peak_rss_mb": build_peak_rss,
+        "query_latency_us": summarize(values=latencies),
+        "candidates_per_query": summarize(values=candidates_counts),
+        "mismatches": mismatches,
+        "batch_us_per_query": batch_time / len(queries) * 1e6,
+        "batch_mismatches": batch_mismatches,
+        "updates": n_updates,
+        "update_mismatches": update_mismatches,
+        "unmerged_nodes": unmerged_nodes,
+        "peak_rss_mb": get_peak_rss()
+    }
+
+
+def main(sizes: list[int], distributions: list[str], n_queries: int, n_updates: int, seed: int,
+         output: str = None) -> int:
+    results = []
+    for distribution in distributions:
+        for size in sizes:
+            with get_context("spawn").Pool(processes=1) as pool:
+                result = pool.apply(run_case, (distribution, size, n_queries, n_updates, seed))
+            print(f"{distribution:>10} {size:>9}: build {result['build_seconds']:8.3f} s, "
+                  f"p50 {result['query_latency_us']['p50']:8.1f} us, p99 {result['query_latency_us']['p99']:8.1f} us, "
+                  f"mismatches {result['mismatches']}, after updates {result['update_mismatches']}, "
+                  f"unmerged nodes {result['unmerged_nodes']}", file=sys.stderr)
+            results.append(result)
+
+    report = json.dumps({
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results
+    }, indent=2)
+
+    if output is None:
+        print(report)
+    else:
+        with open(output, "w") as report_file:
+            report_file.write(report)
+
+    failed = any(result["mismatches"] or result["batch_mismatches"] or result["update_mismatches"] or
+                 result["unmerged_nodes"] for result in results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    sys.exit(main(sizes=args.sizes, distributions=args.distributions, n_queries=args.queries,
+                  n_updates=args.updates, seed=args.seed, output=args.output))